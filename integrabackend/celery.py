@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 from django.conf import settings
 
 # set the default Django settings module for the 'celery' program.
@@ -15,6 +16,12 @@ app.config_from_object('django.conf:settings')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@worker_process_init.connect
+def pool_outbound_requests(**kwargs):
+    from integrabackend.contrib.http import install_pooled_requests
+    install_pooled_requests()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
\ No newline at end of file
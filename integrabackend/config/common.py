@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from os.path import join
 from distutils.util import strtobool
 import dj_database_url
@@ -77,6 +78,19 @@ class Common(Configuration):
         )
     }
 
+    # Cache
+    # Shares the redis instance used by celery, on its own database.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL', 'redis://redis:6379/1'),
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+
     # General
     APPEND_SLASH = False
     TIME_ZONE = 'America/Santo_Domingo'
@@ -236,5 +250,90 @@ class Common(Configuration):
     CELERY_TASK_SERIALIZER = 'json'
     CELERY_RESULT_SERIALIZER = 'json'
     CELERY_TIMEZONE = 'Africa/Nairobi'
+    CELERYBEAT_SCHEDULE = {
+        'reconcile-compensations': {
+            'task': 'reconcile_compensations',
+            'schedule': timedelta(minutes=5),
+        },
+    }
 
     VALID_APPLICATION = False
+    # Keep status rows (BaseStatus, solicitude.State) in memory by name
+    STATUS_REGISTRY = True
+    # Keep gate terminals and their allowed type invitations in memory
+    GATE_REGISTRY = True
+    # Cursor pagination of the lists, 'off', 'opt-in' (?cursor=) or 'always'
+    CURSOR_PAGINATION = os.getenv('CURSOR_PAGINATION', 'opt-in')
+    # Rows read per query by the payment attempt export
+    PAYMENT_EXPORT_CHUNK_SIZE = int(os.getenv('PAYMENT_EXPORT_CHUNK_SIZE', 2000))
+    # Seconds before retrying a SAP compensation, doubled on each failure
+    # up to the max. The task retries COMPENSATION_MAX_RETRIES times, then
+    # the reconciler queues the pending ones every 5 minutes
+    COMPENSATION_RETRY_BACKOFF = 30
+    COMPENSATION_RETRY_MAX_BACKOFF = 60 * 60 * 6
+    COMPENSATION_MAX_RETRIES = 5
+    # Seconds a worker holds a compensation before another can take it
+    COMPENSATION_LEASE = 300
+    COMPENSATION_RECONCILE_BATCH_SIZE = 500
+    # Seconds an allow/deny decision of ApplicationAuthorizeRest is cached
+    APPLICATION_ACCESS_CACHE_TIMEOUT = 300
+    # Seconds the responses of the ERP proxies are cached by endpoint,
+    # endpoints without timeout always call SAP
+    PROXY_CACHE_TIMEOUTS = {
+        'client-info': 60 * 10,
+        'search-client': 60 * 10,
+        'sap-residents': 60 * 10,
+        'sap-principal-email': 60 * 10,
+        'sap-society': 60 * 60 * 12,
+        'sap-exchange-rate': 60 * 60,
+    }
+    # Seconds an expired response is served while it is fetched again
+    PROXY_CACHE_STALE = 60 * 5
+
+    # Outbound HTTP (SAP, Faveo, SITA), see integrabackend.contrib.http
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', 10))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.3))
+    HTTP_POOLED_MODULES = [
+        'oraculo.gods.sap',
+        'oraculo.gods.faveo',
+        'oraculo.gods.sita_db',
+        'oraculo.gods.hermes',
+    ]
+
+    # Credit check of SAP customers (solicitude.helpers.has_credit)
+    CREDIT_CACHE_TIMEOUT = 60
+    CREDIT_FAILURE_CACHE_TIMEOUT = 15
+    # Failures in CREDIT_BREAKER_TIMEOUT seconds that stop calling SAP
+    # for the next CREDIT_BREAKER_TIMEOUT seconds
+    CREDIT_BREAKER_THRESHOLD = 5
+    CREDIT_BREAKER_TIMEOUT = 30
+    CREDIT_CHECK_TIMEOUT = float(os.getenv('CREDIT_CHECK_TIMEOUT', 2))
+    CREDIT_CHECK_WORKERS = 10
+    # Concurrent HelpDesk calls resolving ticket numbers of a page
+    HELPDESK_WORKERS = 10
+    # Seconds a ticket the HelpDesk does not find is not asked again
+    TICKET_NUMBER_MISS_TIMEOUT = 60
+
+    # Key of the permutation of invitation numbers, changing it once
+    # there are invitations may give numbers already used
+    INVITATION_NUMBER_KEY = os.getenv('INVITATION_NUMBER_KEY', 'invitation')
+    INVITATION_NUMBER_RETRIES = 5
+    # png or svg, some email clients do not show svg images
+    INVITATION_BARCODE_FORMAT = os.getenv('INVITATION_BARCODE_FORMAT', 'png')
+    BARCODE_CACHE_TIMEOUT = 60 * 60 * 24
+    # Seconds invitation notifications are collected before sending them
+    INVITATION_NOTIFICATION_WINDOW = 5
+    # Notifications sent by run, a full batch schedules the next one
+    INVITATION_NOTIFICATION_BATCH_SIZE = 200
+    # Seconds before retrying a batch SMTP refused, doubled on each retry
+    INVITATION_NOTIFICATION_RETRY_BACKOFF = 30
+    INVITATION_NOTIFICATION_MAX_RETRIES = 5
+    # Seconds a run holds its batch before another run can take it
+    INVITATION_NOTIFICATION_LEASE = 300
+    # prefix: words starting with the search, ngram: any part of a word
+    # (run rebuild_invitation_search after changing it)
+    INVITATION_SEARCH_MODE = os.getenv('INVITATION_SEARCH_MODE', 'prefix')
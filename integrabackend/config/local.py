@@ -56,3 +56,17 @@ class Local(Common):
         TEMPLATE_DEBUG = False
         TESTS_IN_PROGRESS = True
         MIGRATION_MODULES = DisableMigrations()
+        # Rows of the registry would outlive the rollback of each test
+        STATUS_REGISTRY = False
+        GATE_REGISTRY = False
+        # Mocked ERP responses must not be shared between tests
+        PROXY_CACHE_TIMEOUTS = {}
+        CREDIT_CACHE_TIMEOUT = 0
+        CREDIT_FAILURE_CACHE_TIMEOUT = 0
+        CREDIT_BREAKER_THRESHOLD = 0
+        INVITATION_NOTIFICATION_WINDOW = 0
+        CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }
+        }
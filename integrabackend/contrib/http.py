@@ -0,0 +1,188 @@
+import importlib
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# scheme://host -> requests.Session
+SESSIONS = dict()
+_lock = threading.Lock()
+
+# Latency counters of every upstream, in the shared cache so every
+# gunicorn and celery process adds to (and reports) the same ones
+METRICS_HOSTS_KEY = 'upstream:metrics:hosts'
+METRICS = ('requests', 'errors', 'milliseconds', 'max')
+
+
+def upstream(url):
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def metric_key(host, name):
+    return f'upstream:metrics:{host}:{name}'
+
+
+def incr_metric(key, value):
+    """Add value to the counter, True when the counter is new"""
+    if cache.add(key, value, None):
+        return True
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        cache.set(key, value, None)
+    return False
+
+
+def record_latency(host, seconds, error=False):
+    milliseconds = int(seconds * 1000)
+    try:
+        if incr_metric(metric_key(host, 'requests'), 1):
+            hosts = cache.get(METRICS_HOSTS_KEY) or []
+            if host not in hosts:
+                cache.set(METRICS_HOSTS_KEY, hosts + [host], None)
+        if error:
+            incr_metric(metric_key(host, 'errors'), 1)
+        incr_metric(metric_key(host, 'milliseconds'), milliseconds)
+
+        # Not atomic, a concurrent slower call can be lost
+        max_key = metric_key(host, 'max')
+        if milliseconds > (cache.get(max_key) or 0):
+            cache.set(max_key, milliseconds, None)
+    except Exception:
+        logger.warning('Could not record latency of %s', host, exc_info=True)
+
+
+def latency_metrics():
+    hosts = cache.get(METRICS_HOSTS_KEY) or []
+    values = cache.get_many([
+        metric_key(host, name) for host in hosts for name in METRICS])
+    metrics = dict()
+    for host in hosts:
+        metric = {
+            name: values.get(metric_key(host, name), 0) for name in METRICS}
+        if not metric['requests']:
+            continue
+        metrics[host] = dict(
+            requests=metric['requests'],
+            errors=metric['errors'],
+            avg=metric['milliseconds'] / metric['requests'] / 1000,
+            max=metric['max'] / 1000)
+    return metrics
+
+
+class PooledSession(requests.Session):
+    """
+    Keep-alive session of one upstream with default timeouts, retry with
+    backoff and latency metrics. Only connection errors are retried for
+    POST, the request never reached the server.
+
+    The session is shared by every user and thread, it rejects the
+    cookies of the responses so none is sent on someone else's call (as
+    bare ``requests`` did), cookies passed to a call still go with it.
+    """
+
+    def __init__(self, host):
+        super().__init__()
+        self.host = host
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        retry = Retry(
+            total=settings.HTTP_MAX_RETRIES,
+            backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False)
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault(
+            'timeout',
+            (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+        start = time.time()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.RequestException:
+            record_latency(self.host, time.time() - start, error=True)
+            raise
+        record_latency(
+            self.host, time.time() - start, error=response.status_code >= 500)
+        return response
+
+
+def get_session(url):
+    host = upstream(url)
+    session = SESSIONS.get(host)
+    if session is None:
+        with _lock:
+            session = SESSIONS.setdefault(host, PooledSession(host))
+    return session
+
+
+def request(method, url, **kwargs):
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url, params=None, **kwargs):
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+def put(url, data=None, **kwargs):
+    return request('PUT', url, data=data, **kwargs)
+
+
+def patch(url, data=None, **kwargs):
+    return request('PATCH', url, data=data, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+class PooledRequests:
+    """
+    Drop-in for the ``requests`` module inside the API clients, the
+    verbs go through the pooled sessions and everything else (exceptions,
+    Response...) is the real module.
+    """
+    request = staticmethod(request)
+    get = staticmethod(get)
+    post = staticmethod(post)
+    put = staticmethod(put)
+    patch = staticmethod(patch)
+    delete = staticmethod(delete)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def install_pooled_requests(modules=None):
+    """
+    Make the outbound clients (oraculo, partenon) use the pooled sessions
+    instead of opening a connection per call.
+    """
+    for name in modules or settings.HTTP_POOLED_MODULES:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            logger.warning('Could not pool requests of %s', name)
+            continue
+
+        if getattr(module, 'requests', None) is requests:
+            module.requests = PooledRequests()
@@ -1,5 +1,93 @@
-from django.db import models
 import uuid
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# model label -> {'version': shared version, 'statuses': {name: instance}}
+STATUS_REGISTRY = dict()
+
+
+class StatusManager(models.Manager):
+    """
+    Process wide registry of status rows keyed by name. The rows are
+    tiny and almost never change, so a state transition reads them from
+    memory instead of running get_or_create. Changes bump a version in
+    the shared cache and every process reloads the rows on its next read.
+    """
+
+    @property
+    def registry_key(self):
+        return self.model._meta.label
+
+    @property
+    def version_key(self):
+        return f'status-registry:{self.registry_key}:version'
+
+    def registry_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def warm(self):
+        version = self.registry_version()
+        statuses = {status.name: status for status in self.all()}
+        STATUS_REGISTRY[self.registry_key] = dict(
+            version=version, statuses=statuses)
+        return STATUS_REGISTRY[self.registry_key]
+
+    def clear_registry(self):
+        STATUS_REGISTRY.pop(self.registry_key, None)
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+    def register(self, status, version):
+        """Add a row read on a miss, unless the rows changed since"""
+        registry = STATUS_REGISTRY.get(self.registry_key)
+        if (
+            registry and registry['version'] == version and
+            self.registry_version() == version
+        ):
+            registry['statuses'][status.name] = status
+
+    def get_by_name(self, name):
+        if not settings.STATUS_REGISTRY:
+            status, _ = self.get_or_create(name=name)
+            return status
+
+        registry = STATUS_REGISTRY.get(self.registry_key)
+        if registry is None or registry['version'] != self.registry_version():
+            registry = self.warm()
+
+        status = registry['statuses'].get(name)
+        if status is None:
+            # The row may be created inside the atomic block of the
+            # caller, it is only kept once that block commits
+            status, _ = self.get_or_create(name=name)
+            transaction.on_commit(
+                partial(self.register, status, registry['version']))
+        return status
+
+
+def warm_status_registry():
+    for model in apps.get_models():
+        if isinstance(model._default_manager, StatusManager):
+            model._default_manager.warm()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def clear_status_registry(sender, **kwargs):
+    if isinstance(sender._default_manager, StatusManager):
+        # Again on commit, a process could reload the rows between the
+        # change and its commit
+        sender._default_manager.clear_registry()
+        transaction.on_commit(sender._default_manager.clear_registry)
 
 
 class BaseModel(models.Model):
@@ -20,9 +108,39 @@ class BaseStatus(models.Model):
     )
     name = models.CharField(max_length=50)
 
+    objects = StatusManager()
+
     class Meta:
         abstract = True
 
     def __unicode__(self):
         """Unicode representation of StatusDocument."""
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class BaseSequence(models.Model):
+    """
+    Named counter row. Values are reserved with SELECT ... FOR UPDATE so
+    concurrent workers never receive the same number.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    @classmethod
+    def next_value(cls, name, initial=0):
+        """
+        Reserve the next value of the sequence. ``initial`` (a value or
+        a callable) is the last used value when the row does not exist.
+        """
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(
+                name=name, defaults={'value': initial})
+            sequence.value += 1
+            sequence.save(update_fields=['value'])
+        return sequence.value
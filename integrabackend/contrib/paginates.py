@@ -0,0 +1,50 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPaginate(CursorPagination):
+    """
+    Cursor pagination on the ``cursor_ordering`` of the view, indexed
+    columns ending with the UUID primary key so rows with the same value
+    keep a stable order. The cursor keeps the value of the first column
+    only: a page is a range scan from it, and the rows of the previous
+    pages sharing that value are skipped with an offset. A page costs
+    the same on page 1 and page 10.000 while that column is nearly
+    unique, like a creation date; each page through a run of equal
+    values reads the run again.
+
+    settings.CURSOR_PAGINATION migrates the clients: 'off' never
+    paginates, 'opt-in' paginates the requests with ?cursor= (empty for
+    the first page) and 'always' paginates every list. Requests without
+    cursor are answered by ``fallback_class``, unpaginated when None.
+    """
+    ordering = ('-id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    fallback_class = None
+
+    def use_cursor(self, request):
+        mode = settings.CURSOR_PAGINATION
+        if mode == 'always':
+            return True
+        return mode == 'opt-in' and self.cursor_query_param in request.query_params
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if self.use_cursor(request):
+            return super(KeysetPaginate, self).paginate_queryset(
+                queryset, request, view)
+
+        if self.fallback_class is None:
+            return None
+        self.fallback = self.fallback_class()
+        return self.fallback.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return super(KeysetPaginate, self).get_paginated_response(data)
@@ -0,0 +1,73 @@
+from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import StatusManager
+
+
+def status_tables():
+    """Tables of the status rows, they are tiny and read by name"""
+    return {
+        model._meta.db_table for model in apps.get_models()
+        if isinstance(model._default_manager, StatusManager)}
+
+
+class QueryPlanMixin(object):
+    """
+    Assertions on the SQL run by an API call: the queries of a list must
+    not grow with its rows (N+1) and no query may filter a table that
+    has no index for it (EXPLAIN type ALL, on MySQL).
+    """
+    # Tables small enough to be scanned, besides the status tables
+    scan_allowed = ()
+
+    def capture(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return context.captured_queries
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def full_scans(self, queries):
+        allowed = status_tables() | set(self.scan_allowed)
+        scans = list()
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            for row in self.explain(sql):
+                if (
+                    row['type'] == 'ALL' and
+                    not row['possible_keys'] and
+                    'Using where' in (row['Extra'] or '') and
+                    row['table'] not in allowed
+                ):
+                    scans.append(f"{row['table']}: {sql}")
+        return scans
+
+    def assertNoFullScan(self, queries):
+        if connection.vendor != 'mysql':
+            return
+        scans = self.full_scans(queries)
+        self.assertFalse(scans, 'Full table scans:\n' + '\n'.join(scans))
+
+    def assertQueriesConstant(self, url, create, params=None, sizes=(1, 5)):
+        """
+        Call ``create(size)`` to add rows before each request, the
+        requests must run the same number of queries.
+        """
+        counts = list()
+        for size in sizes:
+            create(size)
+            queries = self.capture(url, params)
+            counts.append(len(queries))
+
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'Queries grow with the rows listed {dict(zip(sizes, counts))}')
+        return queries
@@ -58,5 +58,9 @@ class StatusInvitationEnums(DefaultEnums):
     cancel = 'Cancelled'
 
 
+class SequenceEnums:
+    invitation_number = 'invitation-number'
+
+
 class Subjects:
     send_notification = 'Notificación de invitación - Puntacana Resort and Club'  #noqa
\ No newline at end of file
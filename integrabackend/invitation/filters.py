@@ -1,8 +1,7 @@
 import django_filters
-from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 
-from integrabackend.invitation import models
+from integrabackend.invitation import models, search
 
 
 class InvitationFilter(django_filters.FilterSet):
@@ -21,11 +20,15 @@ class InvitationFilter(django_filters.FilterSet):
     
     def query_filter(self, queryset, name, value):
         """
-        Solution find in 
-            https://stackoverflow.com/questions/57270470/
-            django-filter-how-to-make-multiple-fields-search-with-django-filter
+        Search on guest name, property address and number through
+        InvitationSearchTerm, on top of the queryset of the view.
         """
-        return self.Meta.model.objects.filter(
-            Q(invitated__name__icontains=value) |
-            Q(ownership__address__icontains=value) |
-            Q(number__icontains=value))
\ No newline at end of file
+        # Terms are stored lowercased, istartswith keeps LIKE on the
+        # column collation (startswith is LIKE BINARY on MySQL) so the
+        # (term, invitation) index is used
+        for term, is_prefix in search.query_terms(value):
+            lookup = 'term__istartswith' if is_prefix else 'term'
+            queryset = queryset.filter(
+                pk__in=models.InvitationSearchTerm.objects.filter(
+                    **{lookup: term}).values('invitation_id'))
+        return queryset
\ No newline at end of file
@@ -1,40 +1,70 @@
+import io
+
 import barcode
-from barcode.writer import ImageWriter
+from barcode.writer import ImageWriter, SVGWriter
 from celery.utils.log import get_task_logger
 from django.conf import settings
-from django.core.mail import EmailMessage, send_mail
-from django.core.files import File
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.core.files.base import ContentFile
 from django.template.loader import get_template
 
 from integrabackend.celery import app
 from integrabackend.invitation.enums import Subjects
-from integrabackend.invitation.models import Invitation
+from integrabackend.invitation.models import Invitation, InvitationNotification
 
 logger = get_task_logger(__name__)
 
-@app.task(name="notify_invitation")
-def notify_invitation(
-        invitation_id,
-        email_template='emails/invitation/notify.html',
-        email_class=EmailMessage):
-    invitation = Invitation.objects.get(id=invitation_id)
+NOTIFICATION_RELATED = (
+    'ownership', 'invitated', 'type_invitation', 'create_by')
+NOTIFICATION_BATCH_KEY = 'invitation-notification:batch'
 
-    if invitation.is_supplier:
-        return
+BARCODE_WRITERS = {
+    'png': ImageWriter,
+    'svg': SVGWriter,
+}
+
+
+def barcode_cache_key(number, barcode_format):
+    return f'barcode:{barcode_format}:{number}'
 
-    if not invitation.barcode:
+
+def render_barcode(number, barcode_format=None, cache=cache):
+    """
+    Render the EAN-13 barcode of the number in memory, png or svg. The
+    rendered content is cached by number.
+    """
+    barcode_format = barcode_format or settings.INVITATION_BARCODE_FORMAT
+    key = barcode_cache_key(number, barcode_format)
+    content = cache.get(key)
+    if content is None:
+        buffer = io.BytesIO()
         barcode.get(
             'ean13',
-            f'{invitation.number}',
-            writer=ImageWriter()
-        ).save(f'invitation_{invitation.number}')
+            f'{number}',
+            writer=BARCODE_WRITERS[barcode_format]()
+        ).write(buffer)
+        content = buffer.getvalue()
+        cache.set(key, content, settings.BARCODE_CACHE_TIMEOUT)
+    return content
+
+def save_barcode(invitation):
+    if invitation.barcode:
+        return
 
-        with open(f'invitation_{invitation.number}.png', 'rb') as f:
-            invitation.barcode.save(
-                f'invitation_{invitation.number}.png',
-                File(f), save=True)
+    barcode_format = settings.INVITATION_BARCODE_FORMAT
+    invitation.barcode.save(
+        f'invitation_{invitation.number}.{barcode_format}',
+        ContentFile(render_barcode(invitation.number, barcode_format)),
+        save=True)
 
-    email_template = get_template(email_template)
+
+def build_invitation_message(invitation, email_template, email_class=EmailMessage):
+    """
+    Notification of the invitation, ``email_template`` is a compiled
+    template so a batch renders every message with the same one.
+    """
+    save_barcode(invitation)
 
     invitation_property = [
         ('Propiedad a vistiar', invitation.ownership.address),
@@ -59,6 +89,116 @@ def notify_invitation(
         settings.DEFAULT_FROM_EMAIL,
         to=[invitation.invitated.email], cc=[invitation.create_by.email])
     msg.content_subtype = "html"  # Main content is now text/html
-    msg.send()
+    return msg
+
+
+@app.task(name="notify_invitation")
+def notify_invitation(
+        invitation_id,
+        email_template='emails/invitation/notify.html',
+        email_class=EmailMessage):
+    invitation = Invitation.objects.select_related(
+        *NOTIFICATION_RELATED).get(id=invitation_id)
+
+    if invitation.is_supplier:
+        return
+
+    build_invitation_message(
+        invitation, get_template(email_template), email_class).send()
 
     return True
+
+
+def queue_invitation_notification(
+        invitation_id, email_template='emails/invitation/notify.html'):
+    """
+    Add the invitation to the pending notifications, the first one of
+    a window schedules the task that sends the whole batch. When the
+    cache can't hold the window every notification schedules it, the
+    task sends whatever is pending.
+    """
+    InvitationNotification.objects.create(
+        invitation_id=invitation_id, email_template=email_template)
+
+    window = settings.INVITATION_NOTIFICATION_WINDOW
+    try:
+        scheduled = cache.add(NOTIFICATION_BATCH_KEY, True, window) is False
+    except Exception:
+        logger.exception('Cant set the invitation notification window')
+        scheduled = False
+
+    if not scheduled:
+        notify_invitations.apply_async(countdown=window)
+
+
+@app.task(name="notify_invitations", bind=True,
+          max_retries=settings.INVITATION_NOTIFICATION_MAX_RETRIES)
+def notify_invitations(self, email_class=EmailMessage, connection=None):
+    """
+    Send up to INVITATION_NOTIFICATION_BATCH_SIZE pending notifications
+    with one query for the invitations, one compiled template per kind
+    of email and one SMTP connection.
+
+    The batch is claimed first, so overlapping runs never send the same
+    notification. A notification that can't be built is logged and
+    dropped, the sent ones are deleted as soon as the batch stops and
+    the rest released. When SMTP fails the rest of the batch is retried
+    with exponential backoff.
+    """
+    batch_size = settings.INVITATION_NOTIFICATION_BATCH_SIZE
+    claim = InvitationNotification.objects.claim(batch_size)
+    pending = list(InvitationNotification.objects.filter(
+        claim=claim).order_by('created').values_list(
+            'pk', 'invitation_id', 'email_template'))
+    if not pending:
+        return 0
+
+    invitations = Invitation.objects.select_related(
+        *NOTIFICATION_RELATED).in_bulk(
+            {invitation_id for _, invitation_id, _ in pending})
+
+    # (invitation, template) -> pending rows, repeated rows send one email
+    notifications = dict()
+    for pk, invitation_id, email_template in pending:
+        notifications.setdefault((invitation_id, email_template), []).append(pk)
+
+    templates = dict()
+    messages = list()
+    done = list()
+    for (invitation_id, email_template), pks in notifications.items():
+        invitation = invitations.get(invitation_id)
+        if not invitation or invitation.is_supplier:
+            done += pks
+            continue
+
+        try:
+            if email_template not in templates:
+                templates[email_template] = get_template(email_template)
+            messages.append((pks, build_invitation_message(
+                invitation, templates[email_template], email_class)))
+        except Exception:
+            logger.exception(
+                f'Dropping notification {email_template} of invitation '
+                f'{invitation_id}')
+            done += pks
+
+    sent = 0
+    connection = connection or get_connection()
+    try:
+        with connection:
+            for pks, message in messages:
+                sent += connection.send_messages([message])
+                done += pks
+    except Exception as exception:
+        raise self.retry(
+            exc=exception,
+            countdown=settings.INVITATION_NOTIFICATION_RETRY_BACKOFF * (
+                2 ** self.request.retries))
+    finally:
+        InvitationNotification.objects.filter(pk__in=done).delete()
+        InvitationNotification.objects.release(claim)
+        logger.info(f'{sent} invitation notifications sent')
+
+    if len(pending) == batch_size:
+        notify_invitations.apply_async()
+    return sent
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from integrabackend.invitation import models
+from integrabackend.resident.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Store the area of the property project on every invitation'
+
+    def handle(self, *args, **options):
+        updated = 0
+        for project_id, area_id in Project.objects.values_list('pk', 'area'):
+            updated += models.Invitation.objects.filter(
+                ownership__project=project_id
+            ).exclude(area_id=area_id).update(area_id=area_id)
+
+        updated += models.Invitation.objects.filter(
+            ownership__project__isnull=True, area_id__isnull=False
+        ).update(area_id=None)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{updated} invitations updated'))
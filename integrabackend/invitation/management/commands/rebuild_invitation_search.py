@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from integrabackend.invitation import models
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search terms of every invitation'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Invitations indexed per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pks = list(models.Invitation.objects.values_list('pk', flat=True))
+
+        for start in range(0, len(pks), batch_size):
+            models.index_invitations(
+                models.Invitation.objects.filter(
+                    pk__in=pks[start:start + batch_size]
+                ).select_related('invitated', 'ownership'),
+                batch_size=batch_size)
+            self.stdout.write(
+                f'{min(start + batch_size, len(pks))}/{len(pks)} indexed')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(pks)} invitations indexed'))
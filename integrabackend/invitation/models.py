@@ -1,14 +1,73 @@
+import hashlib
 import uuid
 import random
-from django.db import models, IntegrityError
-from integrabackend.contrib.models import BaseModel, BaseStatus
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from integrabackend.contrib.models import BaseModel, BaseSequence, BaseStatus
+
+from . import enums, search
+
+# 12 digits numbers, the EAN-13 barcode adds the check digit
+NUMBER_MIN = 100000000000
+NUMBER_SPACE = 900000000000
+NUMBER_HALF = 10 ** 6
 
-from . import enums
 
 def random_number():
     return str(random.randint(100000000000, 999999999999))
 
 
+def feistel(value, key, rounds=4):
+    """
+    Permutation of [0, 10 ** 12) with a balanced Feistel network over
+    two halves of 6 digits.
+    """
+    left, right = divmod(value, NUMBER_HALF)
+    for round_ in range(rounds):
+        digest = hashlib.sha256(f'{key}:{round_}:{right}'.encode()).digest()
+        mixed = left + int.from_bytes(digest[:8], 'big')
+        left, right = right, mixed % NUMBER_HALF
+    return left * NUMBER_HALF + right
+
+
+def permute_number(value, key):
+    """
+    Permutation of [0, NUMBER_SPACE), walking the Feistel cycle until
+    the value falls inside the space again.
+    """
+    value = feistel(value, key)
+    while value >= NUMBER_SPACE:
+        value = feistel(value, key)
+    return value
+
+
+def invitation_number(position, key=None):
+    """
+    Number of the invitation allocated in ``position`` of the sequence.
+    Different positions never give the same number and consecutive ones
+    do not look consecutive.
+    """
+    key = key or settings.INVITATION_NUMBER_KEY
+    return str(NUMBER_MIN + permute_number(position % NUMBER_SPACE, key))
+
+
+class Sequence(BaseSequence):
+    pass
+
+
+def next_invitation_number():
+    position = Sequence.next_value(enums.SequenceEnums.invitation_number)
+    return invitation_number(position - 1)
+
+
 class StatusInvitation(BaseStatus):
     pass
 
@@ -94,6 +153,10 @@ class Invitation(BaseModel):
     invitated = models.ForeignKey("resident.Person", on_delete=models.CASCADE)
     total_companions = models.IntegerField(null=True, blank=True, default=0)
 
+    # ownership.project.area_id, kept in sync so the security agents
+    # scope invitations without joining Property and Project
+    area_id = models.UUIDField(null=True, blank=True, editable=False)
+
     @property
     def is_pending(self):
         return self.status.name == enums.StatusInvitationEnums.pending
@@ -119,16 +182,186 @@ class Invitation(BaseModel):
             ('can_check_in', 'Puede hacer check-in'),
             ('can_check_out', 'Puede hacer check-out'),
         ]
+        indexes = [
+            models.Index(fields=['area_id', 'status', 'date_entry']),
+            models.Index(fields=['create_by', 'status', 'date_entry']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Invitation, cls).from_db(db, field_names, values)
+        instance._loaded_ownership_id = instance.__dict__.get('ownership_id')
+        instance._loaded_search = instance.search_key()
+        return instance
+
+    def search_key(self):
+        """Columns the search terms are built from"""
+        return tuple(
+            self.__dict__.get(field)
+            for field in ('number', 'invitated_id', 'ownership_id'))
+
+    def update_area(self):
+        """Set area_id when the invitation is new or changes property"""
+        loaded = getattr(self, '_loaded_ownership_id', None)
+        if self.area_id and self.ownership_id == loaded:
+            return
+
+        self.area_id = apps.get_model('resident', 'Property').objects.filter(
+            pk=self.ownership_id).values_list('project__area', flat=True).first()
+        self._loaded_ownership_id = self.ownership_id
 
     def save(self, *args, **kwargs):
-        if not self.number:
-            number = str(random.randint(100000000000, 999999999999))
-            exist_invitation = self._meta.model.objects.filter(number=number)
+        self.update_area()
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'ownership' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'area_id'}
+        if self.number:
+            return super(Invitation, self).save(*args, **kwargs)
+
+        # Allocated numbers are unique, only the random numbers of old
+        # invitations can be taken already
+        for _ in range(settings.INVITATION_NUMBER_RETRIES):
+            self.number = next_invitation_number()
+            try:
+                with transaction.atomic():
+                    return super(Invitation, self).save(*args, **kwargs)
+            except IntegrityError:
+                taken = self._meta.model.objects.filter(number=self.number)
+                self.number = None
+                if not taken.exists():
+                    raise
+        raise IntegrityError('Could not allocate an invitation number')
+
+
+class InvitationSearchTerm(models.Model):
+    """
+    Words (or trigrams) of the guest name, property address and number
+    of the invitation, so the search is an indexed lookup instead of
+    LIKE '%value%' over two joins.
+    """
+    invitation = models.ForeignKey(
+        "invitation.Invitation", related_name='search_terms',
+        on_delete=models.CASCADE)
+    term = models.CharField(max_length=search.TERM_LENGTH)
 
-            if exist_invitation.exists():
-                return self.save(*args, **kwargs)
-            self.number = number
-        super(Invitation, self).save(*args, **kwargs)
+    class Meta:
+        indexes = [models.Index(fields=['term', 'invitation'])]
+
+
+def index_invitations(invitations, batch_size=1000):
+    """
+    Rebuild the search terms of the invitations, they need invitated
+    and ownership (use select_related on querysets).
+    """
+    invitations = list(invitations)
+    InvitationSearchTerm.objects.filter(
+        invitation__in=[invitation.pk for invitation in invitations]
+    ).delete()
+    InvitationSearchTerm.objects.bulk_create([
+        InvitationSearchTerm(invitation=invitation, term=term)
+        for invitation in invitations
+        for term in search.index_terms(
+            invitation.invitated.name,
+            invitation.ownership.address,
+            invitation.number)
+    ], batch_size=batch_size)
+
+
+@receiver(post_save, sender=Invitation)
+def index_invitation(
+        sender, instance, created=False, raw=False, update_fields=None,
+        **kwargs):
+    searchable = {'number', 'invitated', 'ownership'}
+    if raw or (update_fields and not searchable & set(update_fields)):
+        return
+
+    search_key = instance.search_key()
+    if not created and getattr(instance, '_loaded_search', None) == search_key:
+        return
+    index_invitations([instance])
+    instance._loaded_search = search_key
+
+
+# sender model name -> (invitation field, searched field)
+RELATED_SEARCH_FIELDS = {
+    'person': ('invitated', 'name'),
+    'property': ('ownership', 'address'),
+}
+
+
+@receiver(post_save, sender='resident.Person')
+@receiver(post_save, sender='resident.Property')
+def index_related_invitations(
+        sender, instance, created=False, raw=False, **kwargs):
+    # A new row has no invitations yet
+    if raw or created:
+        return
+
+    field, searched = RELATED_SEARCH_FIELDS[sender._meta.model_name]
+    loaded = f'_loaded_{searched}'
+    value = getattr(instance, searched)
+    if hasattr(instance, loaded) and getattr(instance, loaded) == value:
+        return
+
+    index_invitations(Invitation.objects.filter(
+        **{field: instance}).select_related('invitated', 'ownership'))
+    setattr(instance, loaded, value)
+
+
+@receiver(post_save, sender='resident.Property')
+def update_property_invitations_area(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    area_id = apps.get_model('resident', 'Project').objects.filter(
+        pk=instance.project_id).values_list('area', flat=True).first()
+    Invitation.objects.filter(ownership=instance).exclude(
+        area_id=area_id).update(area_id=area_id)
+
+
+@receiver(post_save, sender='resident.Project')
+def update_project_invitations_area(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    Invitation.objects.filter(ownership__project=instance).exclude(
+        area_id=instance.area_id).update(area_id=instance.area_id)
+
+
+class InvitationNotificationManager(models.Manager):
+
+    def claim(self, batch_size):
+        """
+        Lease the oldest notifications nobody holds for
+        INVITATION_NOTIFICATION_LEASE seconds, return the claim of the
+        rows this run must send. A run overlapping it skips them.
+        """
+        now = timezone.now()
+        free = Q(claimed_until__isnull=True) | Q(claimed_until__lte=now)
+        pks = list(self.filter(free).order_by('created').values_list(
+            'pk', flat=True)[:batch_size])
+        claim = uuid.uuid4()
+        self.filter(free, pk__in=pks).update(
+            claim=claim,
+            claimed_until=now + timedelta(
+                seconds=settings.INVITATION_NOTIFICATION_LEASE))
+        return claim
+
+    def release(self, claim):
+        return self.filter(claim=claim).update(claim=None, claimed_until=None)
+
+
+class InvitationNotification(BaseModel):
+    """Notification waiting for the next batch of helpers.notify_invitations"""
+    invitation = models.ForeignKey(
+        "invitation.Invitation", on_delete=models.CASCADE)
+    email_template = models.CharField(max_length=120)
+    created = models.DateTimeField(auto_now_add=True)
+    # Run sending it until claimed_until, then any run may take it again
+    claim = models.UUIDField(blank=True, null=True, db_index=True)
+    claimed_until = models.DateTimeField(blank=True, null=True)
+
+    objects = InvitationNotificationManager()
 
 
 class CheckPoint(BaseModel):
@@ -146,6 +379,65 @@ class CheckPoint(BaseModel):
         return f'{self.name}'
 
 
+# Terminal of a gate and the type invitation ids its check point allows
+Gate = namedtuple('Gate', ['terminal', 'type_invitation_allowed'])
+
+# {'version': version of the shared cache, 'gates': {ip address: Gate}}
+GATE_REGISTRY = dict()
+GATE_REGISTRY_VERSION_KEY = 'gate-registry:version'
+
+
+class TerminalManager(models.Manager):
+    """
+    Process wide index of terminal ip address -> check point -> allowed
+    type invitation ids. Gate terminals are few and almost never change,
+    so a check-in reads them from memory. Changes bump a version in the
+    shared cache and every process rebuilds its index on the next scan.
+    """
+
+    def registry_version(self):
+        version = cache.get(GATE_REGISTRY_VERSION_KEY)
+        if version is None:
+            cache.add(GATE_REGISTRY_VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(GATE_REGISTRY_VERSION_KEY)
+        return version
+
+    def warm(self):
+        version = self.registry_version()
+        through = CheckPoint.type_invitation_allowed.through
+        allowed = defaultdict(set)
+        for check_point_id, type_invitation_id in through.objects.values_list(
+                'checkpoint_id', 'typeinvitation_id'):
+            allowed[check_point_id].add(type_invitation_id)
+
+        gates = {
+            terminal.ip_address: Gate(
+                terminal, frozenset(allowed[terminal.check_point_id]))
+            for terminal in self.select_related('check_point')}
+        GATE_REGISTRY.update(version=version, gates=gates)
+        return gates
+
+    def get_gate(self, ip_address):
+        if not settings.GATE_REGISTRY:
+            terminal = self.select_related('check_point').filter(
+                ip_address=ip_address).first()
+            if terminal is None:
+                return None
+            return Gate(terminal, frozenset(
+                terminal.check_point.type_invitation_allowed.values_list(
+                    'id', flat=True)))
+
+        gates = GATE_REGISTRY.get('gates')
+        if gates is None or GATE_REGISTRY['version'] != self.registry_version():
+            gates = self.warm()
+        return gates.get(ip_address)
+
+
+def clear_gate_registry(sender, **kwargs):
+    GATE_REGISTRY.clear()
+    cache.set(GATE_REGISTRY_VERSION_KEY, uuid.uuid4().hex, None)
+
+
 class Terminal(BaseModel):
     name = models.CharField('Nombre', max_length=250)
     ip_address = models.GenericIPAddressField(unique=True)
@@ -155,6 +447,15 @@ class Terminal(BaseModel):
         "invitation.CheckPoint",
         on_delete=models.DO_NOTHING)
 
+    objects = TerminalManager()
+
+
+for gate_model in (Terminal, CheckPoint):
+    post_save.connect(clear_gate_registry, sender=gate_model)
+    post_delete.connect(clear_gate_registry, sender=gate_model)
+m2m_changed.connect(
+    clear_gate_registry, sender=CheckPoint.type_invitation_allowed.through)
+
 
 class CheckIn(BaseModel):
     note = models.CharField('Nota', max_length=50)
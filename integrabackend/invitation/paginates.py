@@ -0,0 +1,24 @@
+from rest_framework.pagination import PageNumberPagination
+
+from integrabackend.contrib.paginates import KeysetPaginate
+
+
+class InvitationPaginate(PageNumberPagination):
+    """
+    Pages of ?page_size= invitations, without ?page or ?page_size the
+    list keeps answering every invitation as before.
+    """
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = (self.page_query_param, self.page_size_query_param)
+        if not any(param in request.query_params for param in params):
+            return None
+        return super(InvitationPaginate, self).paginate_queryset(
+            queryset, request, view)
+
+
+class InvitationCursorPaginate(KeysetPaginate):
+    fallback_class = InvitationPaginate
@@ -0,0 +1,53 @@
+import re
+import unicodedata
+
+from django.conf import settings
+
+WORD = re.compile(r'[a-z0-9]+')
+NGRAM_SIZE = 3
+TERM_LENGTH = 64
+
+
+def normalize(value):
+    """
+    Lowercase words of the value without accents, so 'José Peña'
+    gives ['jose', 'pena'].
+    """
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = value.encode('ascii', 'ignore').decode().lower()
+    return [word[:TERM_LENGTH] for word in WORD.findall(value)]
+
+
+def ngrams(word, size=NGRAM_SIZE):
+    if len(word) <= size:
+        return [word]
+    return [word[start:start + size] for start in range(len(word) - size + 1)]
+
+
+def index_terms(*values, mode=None):
+    """
+    Terms stored for the values, the words in prefix mode and their
+    trigrams in ngram mode.
+    """
+    mode = mode or settings.INVITATION_SEARCH_MODE
+    words = {word for value in values for word in normalize(value)}
+    if mode == 'ngram':
+        return {gram for word in words for gram in ngrams(word)}
+    return words
+
+
+def query_terms(value, mode=None):
+    """
+    (term, is_prefix) pairs an invitation must match to be found by the
+    value. In prefix mode every word matches the start of a stored word,
+    in ngram mode every trigram matches (any part of a word) and words
+    shorter than a trigram match the start of one.
+    """
+    mode = mode or settings.INVITATION_SEARCH_MODE
+    terms = set()
+    for word in normalize(value):
+        if mode == 'ngram' and len(word) >= NGRAM_SIZE:
+            terms.update((gram, False) for gram in ngrams(word))
+        else:
+            terms.add((word, True))
+    return sorted(terms)
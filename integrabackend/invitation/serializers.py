@@ -1,3 +1,4 @@
+from django.db import transaction
 from rest_framework import serializers
 from . import models, enums
 from ..solicitude.serializers import DaySerializer
@@ -144,6 +145,34 @@ class CheckInSerializer(serializers.ModelSerializer):
         exclude = ['terminal', 'invitation']
         read_only = ('id', 'user', 'date')
 
+    def resolve_persons(self, persons, create_by):
+        """
+        Existing person of each companion by (type_identification,
+        identification) with one query, the missing ones are created
+        with one bulk insert.
+        """
+        companions = OrderedDict(
+            ((person['type_identification'].id, person['identification']),
+             person)
+            for person in persons)
+        if not companions:
+            return []
+
+        existing = dict()
+        for instance in Person.objects.filter(
+                type_identification__in={key[0] for key in companions},
+                identification__in={key[1] for key in companions}):
+            key = (instance.type_identification_id, instance.identification)
+            if key in companions:
+                existing.setdefault(key, instance)
+
+        missing = [
+            Person(create_by=create_by, **person)
+            for key, person in companions.items() if key not in existing]
+        Person.objects.bulk_create(missing)
+        return list(existing.values()) + missing
+
+    @transaction.atomic
     def create(self, validated_data):
         persons = validated_data.pop('persons', [])
 
@@ -171,20 +200,7 @@ class CheckInSerializer(serializers.ModelSerializer):
         validated_data['guest'] = invitation.invitated
 
         check_in = self.Meta.model.objects.create(**validated_data)
-
-        for person in persons:
-            type_identification = person.pop('type_identification')
-            person['type_identification'] = type_identification.id
-            serializer = PersonSerializer(data=person)
-            serializer.is_valid(raise_exception=True)
-
-            instance = Person.objects.filter(**person)
-            if instance.exists():
-                check_in.persons.add(instance.first())
-            else:
-                person['create_by_id'] = check_in.user.id
-                person['type_identification'] = type_identification
-                check_in.persons.add(Person.objects.create(**person))
+        check_in.persons.add(*self.resolve_persons(persons, check_in.user))
         return check_in
 
 
@@ -0,0 +1,162 @@
+import os
+import time
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from mock import patch
+
+from ...resident.test.factories import PersonFactory
+from .. import filters, models, search
+from . import factories
+
+
+class TestSearchTerms(TestCase):
+
+    def test_normalize_words(self):
+        self.assertEqual(search.normalize('José  Peña-Díaz'), ['jose', 'pena', 'diaz'])
+
+    def test_prefix_terms(self):
+        self.assertEqual(
+            search.index_terms('Ana Pérez', mode='prefix'), {'ana', 'perez'})
+
+    def test_ngram_terms(self):
+        self.assertEqual(
+            search.index_terms('Pérez', mode='ngram'), {'per', 'ere', 'rez'})
+        self.assertEqual(
+            search.query_terms('re', mode='ngram'), [('re', True)])
+
+
+class TestInvitationSearch(TestCase):
+
+    def setUp(self):
+        self.invitation = factories.InvitationFactory.create(
+            invitated__name='María Fernández',
+            ownership__address='Calle Los Corales 12')
+        factories.InvitationFactory.create(
+            invitated__name='Pedro Martínez',
+            ownership__address='Avenida Barceló 4')
+
+    def search(self, value, queryset=None):
+        queryset = queryset or models.Invitation.objects.all()
+        return list(filters.InvitationFilter(
+            {'search': value}, queryset=queryset).qs)
+
+    def test_search_by_name_prefix(self):
+        self.assertEqual(self.search('mari fern'), [self.invitation])
+
+    def test_search_by_address(self):
+        self.assertEqual(self.search('corales'), [self.invitation])
+
+    def test_search_by_number(self):
+        self.assertEqual(self.search(self.invitation.number), [self.invitation])
+
+    def test_search_keep_queryset_scope(self):
+        queryset = models.Invitation.objects.exclude(pk=self.invitation.pk)
+        self.assertEqual(self.search('maria', queryset), [])
+
+    def test_rename_person_update_terms(self):
+        # WHEN
+        person = self.invitation.invitated
+        person.name = 'Lucía Gómez'
+        person.save()
+
+        # THEN
+        self.assertEqual(self.search('lucia'), [self.invitation])
+        self.assertEqual(self.search('maria'), [])
+
+    def test_change_property_address_update_terms(self):
+        # WHEN
+        ownership = self.invitation.ownership
+        ownership.address = 'Calle Palmeras'
+        ownership.save()
+
+        # THEN
+        self.assertEqual(self.search('palmeras'), [self.invitation])
+
+    def test_search_by_number_prefix(self):
+        number = self.invitation.number
+        self.assertEqual(self.search(number[:6]), [self.invitation])
+        self.assertEqual(self.search(number[3:9]), [])
+
+    def test_save_without_search_changes_keep_terms(self):
+        # GIVEN
+        invitation = models.Invitation.objects.select_related(
+            'invitated', 'ownership').get(pk=self.invitation.pk)
+
+        # WHEN
+        with patch.object(models, 'index_invitations') as index_invitations:
+            invitation.note = 'Check-in'
+            invitation.save()
+            invitation.invitated.email = 'guest@example.com'
+            invitation.invitated.save()
+            invitation.ownership.save()
+
+        # THEN
+        index_invitations.assert_not_called()
+
+    @override_settings(INVITATION_SEARCH_MODE='ngram')
+    def test_ngram_search_inside_words(self):
+        # GIVEN
+        call_command('rebuild_invitation_search')
+
+        # WHEN / THEN
+        self.assertEqual(self.search('nández'), [self.invitation])
+        self.assertEqual(
+            self.search(self.invitation.number[3:9]), [self.invitation])
+
+
+@skipUnless(
+    os.getenv('INVITATION_SEARCH_BENCHMARK_SIZE'),
+    'Set INVITATION_SEARCH_BENCHMARK_SIZE to run the search benchmark')
+class TestInvitationSearchBenchmark(TestCase):
+    """
+    Search against LIKE over the joins. INVITATION_SEARCH_BENCHMARK_SIZE
+    sets the invitations, 1000000 gives the production figure.
+    """
+    size = int(os.getenv('INVITATION_SEARCH_BENCHMARK_SIZE', 0))
+    batch_size = 5000
+
+    def setUp(self):
+        invitation = factories.InvitationFactory.create()
+        persons = [
+            PersonFactory.build(
+                create_by=invitation.create_by,
+                type_identification=invitation.invitated.type_identification)
+            for _ in range(self.size)]
+        for person in persons:
+            person.name = f'guest {person.name}'
+        PersonFactory._meta.model.objects.bulk_create(persons, batch_size=self.batch_size)
+
+        invitations = [
+            models.Invitation(
+                date_entry=invitation.date_entry,
+                date_out=invitation.date_out,
+                number=models.invitation_number(position + 1),
+                status=invitation.status,
+                create_by=invitation.create_by,
+                type_invitation=invitation.type_invitation,
+                ownership=invitation.ownership,
+                invitated=person)
+            for position, person in enumerate(persons)]
+        models.Invitation.objects.bulk_create(
+            invitations, batch_size=self.batch_size)
+        call_command('rebuild_invitation_search', batch_size=self.batch_size)
+        self.target = invitations[-1]
+
+    def test_benchmark_against_like(self):
+        queryset = models.Invitation.objects.all()
+        value = self.target.invitated.name
+
+        start = time.time()
+        found = set(filters.InvitationFilter(
+            {'search': value}, queryset=queryset).qs)
+        indexed = time.time() - start
+
+        start = time.time()
+        like = set(queryset.filter(invitated__name__icontains=value))
+        scan = time.time() - start
+
+        print(f'\n{self.size} invitations: search terms {indexed:.4f}s, '
+              f'LIKE {scan:.4f}s')
+        self.assertEqual(found, like)
@@ -0,0 +1,282 @@
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import skipUnless
+
+from celery.exceptions import Retry
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mock import MagicMock, patch
+
+from .. import helpers, models
+from . import factories
+
+
+class TestRenderBarcode(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_render_png(self):
+        content = helpers.render_barcode('123456789012', 'png')
+        self.assertTrue(content.startswith(b'\x89PNG'))
+
+    def test_render_svg(self):
+        content = helpers.render_barcode('123456789012', 'svg')
+        self.assertIn(b'<svg', content)
+
+    def test_rendered_barcode_is_cached(self):
+        # WHEN
+        with patch.object(
+                helpers.barcode, 'get', wraps=helpers.barcode.get) as get:
+            first = helpers.render_barcode('123456789012', 'png')
+            second = helpers.render_barcode('123456789012', 'png')
+
+        # THEN
+        self.assertEqual(first, second)
+        get.assert_called_once()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TestNotifyInvitation(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.invitation = factories.InvitationFactory.create()
+
+    def test_barcode_not_written_to_working_directory(self):
+        # GIVEN
+        files = set(os.listdir(os.getcwd()))
+
+        # WHEN
+        helpers.notify_invitation(self.invitation.id)
+
+        # THEN
+        self.invitation.refresh_from_db()
+        self.assertEqual(
+            self.invitation.barcode.name,
+            f'invitation-barcode/invitation_{self.invitation.number}.png')
+        self.assertEqual(set(os.listdir(os.getcwd())), files)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    INVITATION_NOTIFICATION_WINDOW=5)
+class TestNotifyInvitations(TestCase):
+    sizes = (5, 50)
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(helpers.notify_invitations, 'apply_async')
+        self.mock_apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_invitations(self, size):
+        return [
+            factories.InvitationFactory.create(
+                barcode='invitation-barcode/invitation.png')
+            for _ in range(size)]
+
+    def test_schedule_one_batch_per_window(self):
+        # WHEN
+        for invitation in self.create_invitations(3):
+            helpers.queue_invitation_notification(invitation.id)
+
+        # THEN
+        self.mock_apply_async.assert_called_once_with(countdown=5)
+        self.assertEqual(models.InvitationNotification.objects.count(), 3)
+
+    def test_send_batch_over_one_connection(self):
+        # GIVEN
+        invitations = self.create_invitations(3)
+        for invitation in invitations:
+            helpers.queue_invitation_notification(invitation.id)
+        helpers.queue_invitation_notification(invitations[0].id)
+        helpers.queue_invitation_notification(
+            invitations[0].id, email_template='emails/invitation/cancel.html')
+
+        # WHEN
+        with patch.object(
+                helpers, 'get_connection',
+                wraps=helpers.get_connection) as get_connection:
+            sent = helpers.notify_invitations()
+
+        # THEN
+        self.assertEqual(sent, 4)
+        self.assertEqual(len(mail.outbox), 4)
+        get_connection.assert_called_once()
+        self.assertFalse(models.InvitationNotification.objects.exists())
+
+    def test_schedule_when_cache_is_down(self):
+        # GIVEN
+        invitation, = self.create_invitations(1)
+
+        # WHEN
+        with patch.object(helpers.cache, 'add', side_effect=ConnectionError):
+            helpers.queue_invitation_notification(invitation.id)
+
+        # THEN
+        self.mock_apply_async.assert_called_once_with(countdown=5)
+
+    def test_drop_notification_that_cant_be_built(self):
+        # GIVEN
+        broken, invitation = self.create_invitations(2)
+        helpers.queue_invitation_notification(broken.id)
+        helpers.queue_invitation_notification(invitation.id)
+        build_invitation_message = helpers.build_invitation_message
+
+        def build(notified, *args):
+            if notified == broken:
+                raise ValueError('Cant render')
+            return build_invitation_message(notified, *args)
+
+        # WHEN
+        with patch.object(helpers, 'build_invitation_message', side_effect=build):
+            sent = helpers.notify_invitations()
+
+        # THEN
+        self.assertEqual(sent, 1)
+        self.assertEqual(mail.outbox[0].to, [invitation.invitated.email])
+        self.assertFalse(models.InvitationNotification.objects.exists())
+
+    @patch.object(helpers.notify_invitations, 'retry')
+    def test_smtp_failure_keep_unsent_and_retry(self, retry):
+        # GIVEN
+        retry.return_value = Retry()
+        sent, unsent = self.create_invitations(2)
+        helpers.queue_invitation_notification(sent.id)
+        helpers.queue_invitation_notification(unsent.id)
+
+        smtp = MagicMock()
+        error = SMTPException('Connection lost')
+        smtp.send_messages.side_effect = [1, error]
+
+        # WHEN
+        with self.assertRaises(Retry):
+            helpers.notify_invitations(connection=smtp)
+
+        # THEN
+        retry.assert_called_once_with(exc=error, countdown=30)
+        self.assertEqual(
+            [(str(invitation_id), claim) for invitation_id, claim in
+             models.InvitationNotification.objects.values_list(
+                 'invitation', 'claim')],
+            [(str(unsent.id), None)])
+
+    def test_overlapping_runs_send_once(self):
+        # GIVEN
+        for invitation in self.create_invitations(3):
+            helpers.queue_invitation_notification(invitation.id)
+        overlapped = list()
+
+        def send_messages(messages):
+            if not overlapped:
+                overlapped.append(helpers.notify_invitations())
+            mail.outbox.extend(messages)
+            return len(messages)
+
+        smtp = MagicMock()
+        smtp.send_messages.side_effect = send_messages
+
+        # WHEN
+        sent = helpers.notify_invitations(connection=smtp)
+        again = helpers.notify_invitations(connection=smtp)
+
+        # THEN
+        self.assertEqual((sent, overlapped, again), (3, [0], 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(models.InvitationNotification.objects.exists())
+
+    def test_send_notifications_of_expired_claim(self):
+        # GIVEN
+        invitation, = self.create_invitations(1)
+        helpers.queue_invitation_notification(invitation.id)
+        models.InvitationNotification.objects.update(
+            claim=uuid.uuid4(),
+            claimed_until=timezone.now() - timedelta(seconds=1))
+
+        # WHEN
+        sent = helpers.notify_invitations()
+
+        # THEN
+        self.assertEqual(sent, 1)
+        self.assertFalse(models.InvitationNotification.objects.exists())
+
+    @override_settings(INVITATION_NOTIFICATION_BATCH_SIZE=2)
+    def test_full_batch_schedule_the_next(self):
+        # GIVEN
+        for invitation in self.create_invitations(3):
+            helpers.queue_invitation_notification(invitation.id)
+
+        # WHEN
+        sent = helpers.notify_invitations()
+
+        # THEN
+        self.assertEqual(sent, 2)
+        self.assertEqual(models.InvitationNotification.objects.count(), 1)
+        self.mock_apply_async.assert_called_with()
+
+    def test_queries_not_grow_with_batch(self):
+        queries = list()
+        for size in self.sizes:
+            for invitation in self.create_invitations(size):
+                helpers.queue_invitation_notification(invitation.id)
+
+            with CaptureQueriesContext(connection) as context:
+                helpers.notify_invitations()
+            queries.append(len(context.captured_queries))
+
+        self.assertEqual(queries[0], queries[1])
+
+
+@skipUnless(
+    os.getenv('INVITATION_NOTIFICATION_BENCHMARK_SIZE'),
+    'Set INVITATION_NOTIFICATION_BENCHMARK_SIZE to run the batch benchmark')
+class TestNotifyInvitationsBenchmark(TestCase):
+    """
+    One task per invitation against one batch for all of them,
+    INVITATION_NOTIFICATION_BENCHMARK_SIZE sets the invitations.
+    """
+    size = int(os.getenv('INVITATION_NOTIFICATION_BENCHMARK_SIZE', 0))
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(helpers.notify_invitations, 'apply_async')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_benchmark_against_task_per_invitation(self):
+        # GIVEN
+        size = self.size
+        invitations = [
+            factories.InvitationFactory.create(
+                barcode='invitation-barcode/invitation.png')
+            for _ in range(size)]
+
+        # WHEN
+        start = time.time()
+        for invitation in invitations:
+            helpers.notify_invitation(invitation.id)
+        single = time.time() - start
+
+        for invitation in invitations:
+            helpers.queue_invitation_notification(invitation.id)
+        start = time.time()
+        helpers.notify_invitations()
+        batch = time.time() - start
+
+        print(f'\n{size} notifications: one task each {single:.3f}s '
+              f'({size / single:.0f}/s), batch {batch:.3f}s '
+              f'({size / batch:.0f}/s)')
+
+        # THEN
+        self.assertEqual(len(mail.outbox), size * 2)
+        self.assertLess(batch, single)
@@ -1,8 +1,19 @@
-from django.test import TestCase
+import os
+import threading
+import time
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import Permission
 
 from nose.tools import eq_, ok_
 
+from ...resident.test.factories import (
+    AreaFactory, ProjectFactory, PropertyFactory)
 from ...users.test.factories import UserFactory
 from .. import models
 from . import factories
@@ -46,3 +57,265 @@ class TestInvitation(TestCase):
         eq_(False, self.user.has_perm('invitation.add_invitation'))
         eq_(False, self.user.has_perm('invitation.change_invitation'))
         eq_(False, self.user.has_perm('invitation.delete_invitation'))
+
+
+class TestInvitationNumber(TestCase):
+
+    def test_permutation_is_unique(self):
+        # WHEN
+        numbers = [models.invitation_number(position) for position in range(20000)]
+
+        # THEN
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_number_has_ean13_format(self):
+        for position in [0, 1, models.NUMBER_SPACE - 1]:
+            number = models.invitation_number(position)
+            self.assertEqual(len(number), 12)
+            self.assertTrue(number.isdigit())
+            self.assertNotEqual(number[0], '0')
+
+    def test_save_allocate_number_without_lookup(self):
+        # WHEN
+        with CaptureQueriesContext(connection) as context:
+            invitation = factories.InvitationFactory.create()
+
+        # THEN
+        self.assertEqual(invitation.number, models.invitation_number(0))
+        lookups = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'invitation_invitation' in query['sql']]
+        self.assertEqual(lookups, [])
+
+    def test_skip_number_of_old_invitation(self):
+        # GIVEN
+        factories.InvitationFactory.create(number=models.invitation_number(0))
+
+        # WHEN
+        invitation = factories.InvitationFactory.create()
+
+        # THEN
+        self.assertEqual(invitation.number, models.invitation_number(1))
+
+    def test_keep_given_number(self):
+        invitation = factories.InvitationFactory.create(number='123456789012')
+        self.assertEqual(invitation.number, '123456789012')
+
+
+class TestInvitationNumberConcurrency(TransactionTestCase):
+    threads = 8
+    invitations_per_thread = 5
+
+    def test_concurrent_invitations_get_unique_number(self):
+        # GIVEN
+        user = UserFactory.create()
+        errors = list()
+
+        def worker():
+            try:
+                for _ in range(self.invitations_per_thread):
+                    factories.InvitationFactory.create(create_by=user)
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                connection.close()
+
+        # WHEN
+        workers = [
+            threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        # THEN
+        self.assertEqual(errors, [])
+        numbers = list(models.Invitation.objects.values_list(
+            'number', flat=True))
+        self.assertEqual(
+            len(numbers), self.threads * self.invitations_per_thread)
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+
+@override_settings(GATE_REGISTRY=True)
+class TestGateRegistry(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        models.GATE_REGISTRY.clear()
+        self.manager = models.Terminal.objects
+        self.terminal = factories.TerminalFactory.create()
+        self.type_invitation = factories.TypeInvitationFactory.create()
+        self.terminal.check_point.type_invitation_allowed.add(
+            self.type_invitation)
+
+    def tearDown(self):
+        models.GATE_REGISTRY.clear()
+
+    def test_get_gate_without_queries(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN / THEN
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                gate = self.manager.get_gate(self.terminal.ip_address)
+        eq_(gate.terminal, self.terminal)
+        eq_(gate.type_invitation_allowed, {self.type_invitation.id})
+
+    def test_unknown_ip_address(self):
+        ok_(self.manager.get_gate('10.0.0.1') is None)
+
+    def test_save_terminal_rebuild_registry(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN
+        self.terminal.ip_address = '10.0.0.1'
+        self.terminal.save()
+
+        # THEN
+        ok_(self.manager.get_gate('10.0.0.1'))
+
+    def test_allowed_type_invitation_change_rebuild_registry(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN
+        self.terminal.check_point.type_invitation_allowed.remove(
+            self.type_invitation)
+
+        # THEN
+        gate = self.manager.get_gate(self.terminal.ip_address)
+        eq_(gate.type_invitation_allowed, frozenset())
+
+    def test_change_in_other_process_rebuild_registry(self):
+        # GIVEN
+        self.manager.warm()
+        models.Terminal.objects.filter(pk=self.terminal.pk).update(
+            ip_address='10.0.0.1')
+
+        # WHEN
+        cache.set(models.GATE_REGISTRY_VERSION_KEY, 'other-process', None)
+
+        # THEN
+        ok_(self.manager.get_gate('10.0.0.1'))
+
+
+class TestInvitationArea(TestCase):
+
+    def setUp(self):
+        self.invitation = factories.InvitationFactory.create()
+        self.project = self.invitation.ownership.project
+
+    def area_id(self):
+        self.invitation.refresh_from_db()
+        return self.invitation.area_id
+
+    def test_area_set_on_create(self):
+        eq_(self.area_id(), self.project.area_id)
+
+    def test_save_without_ownership_change_not_query_area(self):
+        # GIVEN
+        self.invitation.refresh_from_db()
+
+        # WHEN
+        with CaptureQueriesContext(connection) as context:
+            self.invitation.note = 'note'
+            self.invitation.save(update_fields=['note'])
+
+        # THEN
+        eq_(len(context.captured_queries), 1)
+
+    def test_change_ownership(self):
+        # GIVEN
+        ownership = PropertyFactory.create()
+        self.invitation.refresh_from_db()
+
+        # WHEN
+        self.invitation.ownership = ownership
+        self.invitation.save()
+
+        # THEN
+        eq_(self.area_id(), ownership.project.area_id)
+
+    def test_change_property_project(self):
+        # GIVEN
+        project = ProjectFactory.create()
+
+        # WHEN
+        ownership = self.invitation.ownership
+        ownership.project = project
+        ownership.save()
+
+        # THEN
+        eq_(self.area_id(), project.area_id)
+
+    def test_change_project_area(self):
+        # GIVEN
+        area = AreaFactory.create()
+
+        # WHEN
+        self.project.area = area
+        self.project.save()
+
+        # THEN
+        eq_(self.area_id(), area.id)
+
+    def test_backfill(self):
+        # GIVEN
+        models.Invitation.objects.update(area_id=None)
+
+        # WHEN
+        call_command('backfill_invitation_area', stdout=open(os.devnull, 'w'))
+
+        # THEN
+        eq_(self.area_id(), self.project.area_id)
+
+
+@skipUnless(
+    os.getenv('INVITATION_AREA_BENCHMARK_SIZE'),
+    'Set INVITATION_AREA_BENCHMARK_SIZE to run the area scope benchmark')
+class TestInvitationAreaBenchmark(TestCase):
+    """
+    Agent scope through area_id against the join over Property and
+    Project, INVITATION_AREA_BENCHMARK_SIZE sets the invitations.
+    """
+    size = int(os.getenv('INVITATION_AREA_BENCHMARK_SIZE', 0))
+    areas = 20
+
+    def setUp(self):
+        invitation = factories.InvitationFactory.create()
+        ownerships = PropertyFactory.create_batch(self.areas)
+        models.Invitation.objects.bulk_create([
+            models.Invitation(
+                date_entry=invitation.date_entry,
+                date_out=invitation.date_out,
+                number=models.invitation_number(position + 1),
+                status=invitation.status,
+                create_by=invitation.create_by,
+                type_invitation=invitation.type_invitation,
+                invitated=invitation.invitated,
+                ownership=ownerships[position % self.areas])
+            for position in range(self.size)], batch_size=5000)
+        call_command(
+            'backfill_invitation_area', stdout=open(os.devnull, 'w'))
+        self.area_ids = [ownerships[0].project.area_id]
+
+    def test_benchmark_against_join(self):
+        queryset = models.Invitation.objects.all()
+
+        start = time.time()
+        scoped = set(queryset.filter(area_id__in=self.area_ids))
+        denormalized = time.time() - start
+
+        start = time.time()
+        joined = set(queryset.filter(
+            ownership__project__area__in=self.area_ids))
+        join = time.time() - start
+
+        print(f'\n{self.size} invitations: area_id {denormalized:.4f}s, '
+              f'join {join:.4f}s')
+        eq_(scoped, joined)
+        eq_(len(scoped), self.size // self.areas)
@@ -0,0 +1,84 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from integrabackend.contrib.testing import QueryPlanMixin
+from ...resident.test.factories import AreaFactory, PersonFactory
+from ...users.enums import GroupsEnums
+from ...users.test.factories import UserFactory
+from .. import models
+from . import factories
+
+
+class TestInvitationQueryPlan(QueryPlanMixin, APITestCase):
+
+    def setUp(self):
+        self.url = reverse('invitation-list')
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, size):
+        for _ in range(size):
+            invitation = factories.InvitationFactory.create(
+                create_by=self.user,
+                supplier=factories.SupplierFactory.create(name='supplier'))
+            check_in = factories.CheckInFactory.create(
+                invitation=invitation, user=self.user)
+            check_in.persons.add(*PersonFactory.create_batch(2))
+            models.CheckOut.objects.create(
+                invitation=invitation, user=self.user,
+                terminal=check_in.terminal)
+
+    def test_list_queries_constant(self):
+        queries = self.assertQueriesConstant(self.url, self.create)
+        self.assertNoFullScan(queries)
+
+    def test_page_size_queries_constant(self):
+        # GIVEN
+        self.create(12)
+
+        # WHEN
+        small = self.capture(self.url, {'page_size': 2})
+        large = self.capture(self.url, {'page_size': 10})
+
+        # THEN
+        self.assertEqual(len(small), len(large))
+
+    def test_paginate_only_when_asked(self):
+        # GIVEN
+        self.create(3)
+
+        # WHEN
+        listed = self.client.get(self.url).json()
+        page = self.client.get(self.url, {'page_size': 2}).json()
+
+        # THEN
+        self.assertEqual(len(listed), 3)
+        self.assertEqual(page['count'], 3)
+        self.assertEqual(len(page['results']), 2)
+
+    def test_retrieve_queries_constant(self):
+        # GIVEN
+        self.create(1)
+        invitation = models.Invitation.objects.get()
+        url = f'{self.url}{invitation.pk}/'
+
+        # WHEN
+        first = self.capture(url)
+        factories.CheckInFactory._meta.model.objects.get().persons.add(
+            *PersonFactory.create_batch(5))
+        second = self.capture(url)
+
+        # THEN
+        self.assertEqual(len(first), len(second))
+
+    def test_list_own_invitations(self):
+        factories.InvitationFactory.create(create_by=self.user)
+        self.assertNoFullScan(self.capture(self.url))
+
+    def test_list_security_agent_areas(self):
+        area = AreaFactory.create()
+        self.user.areapermission_set.create(area=area)
+        self.user.groups.create(name=GroupsEnums.security_agent)
+        factories.InvitationFactory.create(ownership__project__area=area)
+
+        self.assertNoFullScan(self.capture(self.url))
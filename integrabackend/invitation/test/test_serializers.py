@@ -0,0 +1,48 @@
+from django.test import TestCase
+
+from ...resident.models import Person
+from ...resident.test.factories import PersonFactory
+from ...users.test.factories import UserFactory
+from .. import serializers
+
+
+class TestCheckInSerializerPersons(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.serializer = serializers.CheckInSerializer()
+
+    def companion(self, person):
+        return dict(
+            name=person.name,
+            identification=person.identification,
+            type_identification=person.type_identification)
+
+    def test_resolve_existing_and_new_persons_in_bulk(self):
+        # GIVEN
+        existing = PersonFactory.create_batch(20)
+        new = PersonFactory.build_batch(
+            20, type_identification=existing[0].type_identification)
+        persons = [self.companion(person) for person in existing + new]
+
+        # WHEN
+        with self.assertNumQueries(2):
+            resolved = self.serializer.resolve_persons(persons, self.user)
+
+        # THEN
+        self.assertEqual(len(resolved), 40)
+        self.assertEqual(Person.objects.count(), 40)
+        self.assertTrue(set(existing) <= set(resolved))
+
+    def test_same_person_twice_created_once(self):
+        # GIVEN
+        person = PersonFactory.build()
+        person.type_identification.save()
+        persons = [self.companion(person), self.companion(person)]
+
+        # WHEN
+        resolved = self.serializer.resolve_persons(persons, self.user)
+
+        # THEN
+        self.assertEqual(len(resolved), 1)
+        self.assertEqual(resolved[0].create_by, self.user)
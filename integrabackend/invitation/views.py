@@ -7,7 +7,9 @@ from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
-from . import models, serializers, mixins, enums, permissions, helpers, filters
+from . import (
+    models, serializers, mixins, enums, permissions, helpers, filters,
+    paginates)
 from ..resident.models import Property
 
 
@@ -20,6 +22,28 @@ class InvitationViewSet(viewsets.ModelViewSet):
 
     permission_classes = [permissions.OnlyUpdatePending]
     queryset = models.Invitation.objects.all()
+    pagination_class = paginates.InvitationCursorPaginate
+
+    # Relations the serializers (or the action) read for each invitation
+    related = (
+        'status', 'type_invitation', 'invitated',
+        'supplier__transportation',
+        'checkin__guest', 'checkin__transport', 'checkin__user',
+        'checkout__user')
+    select_related_actions = {
+        'list': related + ('ownership__project__area',),
+        'retrieve': related,
+        'update': related + ('ownership__project__area',),
+        'partial_update': related + ('ownership__project__area',),
+        'check_in': ('status', 'type_invitation', 'invitated', 'checkin'),
+        'check_out': (
+            'status', 'type_invitation', 'invitated', 'checkin', 'checkout'),
+        'resend_notification': ('status', 'type_invitation'),
+    }
+    prefetch_related_actions = {
+        'list': ('checkin__persons',),
+        'retrieve': ('checkin__persons',),
+    }
 
     status_class = models.StatusInvitation
     status_enums = enums.StatusInvitationEnums
@@ -36,13 +60,17 @@ class InvitationViewSet(viewsets.ModelViewSet):
         return serializers.InvitationSerializer
 
     def _get_initial_status(self):
-        status, _ = self.status_class.objects.get_or_create(
-            name=self.status_enums.pending
-        )
+        status = self.status_class.objects.get_by_name(
+            self.status_enums.pending)
         return status
 
     def get_queryset(self):
         queryset = super(InvitationViewSet, self).get_queryset()
+        queryset = queryset.select_related(
+            *self.select_related_actions.get(self.action, ())
+        ).prefetch_related(
+            *self.prefetch_related_actions.get(self.action, ()))
+
         if (
             self.request.user.is_monitoring_center or
             self.request.user.is_aplication
@@ -50,8 +78,9 @@ class InvitationViewSet(viewsets.ModelViewSet):
             return queryset
 
         if self.request.user.is_security_agent:
-            areas = self.request.user.areapermission_set.values('area')
-            return queryset.filter(ownership__project__area__in=areas)
+            areas = self.request.user.areapermission_set.values_list(
+                'area', flat=True)
+            return queryset.filter(area_id__in=list(areas))
 
         return queryset.filter(create_by_id=self.request.user.id)
 
@@ -60,12 +89,12 @@ class InvitationViewSet(viewsets.ModelViewSet):
             create_by_id=self.request.user.id,
             status=self._get_initial_status())
 
-        helpers.notify_invitation.delay(serializer.instance.id.hex)
+        helpers.queue_invitation_notification(serializer.instance.id)
 
     def perform_update(self, serializer):
         super(InvitationViewSet, self).perform_update(serializer)
 
-        helpers.notify_invitation.delay(serializer.instance.id.hex)
+        helpers.queue_invitation_notification(serializer.instance.id)
 
     def apply_action_to_invitation(self, action, status):
         action_serializers = {
@@ -88,26 +117,22 @@ class InvitationViewSet(viewsets.ModelViewSet):
         )(data=self.request.data)
         serializer.is_valid(raise_exception=True)
 
-        terminal = self.model_terminal.objects.filter(
-            ip_address=self.request._request.META.get('REMOTE_ADDR'))
+        gate = self.model_terminal.objects.get_gate(
+            self.request._request.META.get('REMOTE_ADDR'))
 
-        if not terminal.exists():
+        if gate is None:
             raise exceptions.PermissionDenied()
 
-        terminal = terminal.first()
-
-        if not terminal.check_point.type_invitation_allowed.filter(
-            id=self.object.type_invitation.id
-        ):
+        if self.object.type_invitation_id not in gate.type_invitation_allowed:
             raise exceptions.PermissionDenied()
 
         serializer.save(
             invitation=self.object,
             user=self.request.user,
-            terminal=terminal)
+            terminal=gate.terminal)
 
-        self.object.status, _ = self.model_status.objects.get_or_create(
-            name=status)
+        self.object.status = self.model_status.objects.get_by_name(
+            status)
         self.object.save()
         return serializer
 
@@ -120,7 +145,7 @@ class InvitationViewSet(viewsets.ModelViewSet):
         if not self.object.is_pending:
             raise exceptions.PermissionDenied('Invitation is not pending')
 
-        helpers.notify_invitation.delay(self.object.id.hex)
+        helpers.queue_invitation_notification(self.object.id)
 
         return Response({}, status=status.HTTP_200_OK)
 
@@ -133,13 +158,12 @@ class InvitationViewSet(viewsets.ModelViewSet):
         if not self.object.is_pending:
             raise exceptions.PermissionDenied('Invitation is not pending')
 
-        helpers.notify_invitation.delay(
-            self.object.id.hex,
+        helpers.queue_invitation_notification(
+            self.object.id,
             email_template='emails/invitation/cancel.html')
 
-        self.object.status, _ = models.StatusInvitation.objects.get_or_create(
-            name=enums.StatusInvitationEnums.cancel
-        )
+        self.object.status = models.StatusInvitation.objects.get_by_name(
+            enums.StatusInvitationEnums.cancel)
         self.object.save()
         return Response({}, status=status.HTTP_200_OK)
 
@@ -12,4 +12,8 @@ class StatusProcessPayment:
 class StatusCompensation:
     initial = 'Draft'
     not_compensated = 'No Compensada'
-    compensated = 'Compensada'
\ No newline at end of file
+    compensated = 'Compensada'
+
+
+class SequenceEnums:
+    transaction = 'payment-attempt-transaction'
@@ -1,9 +1,18 @@
+import csv
+import json
 from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.forms.models import model_to_dict
 from oraculo.gods import sap
+from oraculo.gods.exceptions import NotFound
+from partenon.ERP import ERPClient
 from partenon.process_payment import azul
+from requests import ConnectionError, ConnectTimeout
+from urllib3.exceptions import NewConnectionError
 
-from . import models
+from . import enums, models
 
 
 class CompensationPayment:
@@ -70,6 +79,232 @@ class CompensationPayment:
         self.sap_response = sap_api.post(self.sap_url, self.build_request_body())
 
 
+def set_compensation_status(payment_attempt, compensated):
+    """Compensation status of the attempt and its documents"""
+    document_status = models.StatusDocument.objects.get_by_name(
+        enums.StatusInvoices.compensated if compensated
+        else enums.StatusInvoices.not_compensated)
+    payment_attempt.invoices.update(status=document_status)
+    payment_attempt.advancepayments.update(status=document_status)
+
+    payment_attempt.status_compensation = (
+        models.StatusCompensation.objects.get_by_name(
+            enums.StatusCompensation.compensated if compensated
+            else enums.StatusCompensation.not_compensated))
+    payment_attempt.save(update_fields=['status_compensation'])
+
+
+def save_compensation_errors(payment_attempt, exception):
+    """Replace the errors of the attempt by the ones SAP answered"""
+    payment_attempt.errors.all().delete()
+    for error in json.loads(exception.args[0])[0].get('error'):
+        error['id_sap'] = error.pop('id')
+        payment_attempt.errors.create(**error)
+
+
+def normalize_document_number(document_number):
+    try:
+        return int(document_number)
+    except (TypeError, ValueError):
+        return document_number
+
+
+def request_not_sent(exception):
+    """
+    Whether the error was raised before the request reached the server
+    (connect timeout or refused), so sending it again can't repeat it.
+    """
+    if isinstance(exception, ConnectTimeout):
+        return True
+    if isinstance(exception, ConnectionError) and exception.args:
+        reason = getattr(exception.args[0], 'reason', exception.args[0])
+        return isinstance(reason, NewConnectionError)
+    return False
+
+
+def compensation_confirmed(
+        payment_attempt, erp_client_class=ERPClient, language='ES'):
+    """
+    Whether SAP compensated the attempt after a call whose answer was
+    lost: True when none of its invoices is open for the customer any
+    more, False when all of them are. None when it can't be told (no
+    invoices, part of them open or SAP unavailable).
+    """
+    invoices = list(payment_attempt.invoices.values_list(
+        'merchant_number', 'document_number'))
+    if not invoices:
+        return None
+
+    erp_client = erp_client_class(client_code=payment_attempt.sap_customer)
+    open_documents = set()
+    try:
+        for merchant in {merchant for merchant, _ in invoices}:
+            try:
+                invoices_sap = erp_client.invoices(
+                    merchant=merchant, language=language)
+            except NotFound:
+                invoices_sap = list()
+            open_documents.update(
+                normalize_document_number(invoice._base.get('document_number'))
+                for invoice in invoices_sap)
+    except Exception:
+        return None
+
+    documents = {
+        normalize_document_number(document_number)
+        for _, document_number in invoices}
+    still_open = open_documents & documents
+    if not still_open:
+        return True
+    if still_open == documents:
+        return False
+    return None
+
+
+def pending_compensation_documents(sap_customer, model=models.Invoice):
+    """
+    Document numbers of the customer invoices that were paid but are
+    still waiting to be compensated in SAP.
+    """
+    return set(model.objects.filter(
+        payment_attempt__sap_customer=sap_customer,
+        payment_attempt__status_compensation__name=(
+            enums.StatusCompensation.not_compensated),
+        status__name=enums.StatusInvoices.not_compensated,
+    ).values_list('document_number', flat=True).distinct())
+
+
+def exclude_pending_compensation(
+        sap_customer, invoices_sap,
+        document_number=lambda invoice: invoice._base.get('document_number'),
+        pending_documents=pending_compensation_documents
+    ):
+    """
+    Remove from the SAP invoices the ones pending of compensation, with
+    a single query for the whole list.
+    """
+    if not invoices_sap:
+        return list()
+
+    pending = pending_documents(sap_customer)
+    return [
+        invoice for invoice in invoices_sap
+        if normalize_document_number(document_number(invoice)) not in pending
+    ]
+
+
+# Columns of the payment attempt repeated on each exported row
+EXPORT_ATTEMPT_FIELDS = (
+    'id', 'date', 'transaction', 'sap_customer', 'sap_customer_name',
+    'user__username', 'merchant_number', 'merchant_name', 'card_brand',
+    'card_number', 'status_process_payment__name',
+    'status_compensation__name', 'request__amount', 'request__itbis',
+    'request__order_number', 'response__response_code',
+    'response__authorization_code', 'response__order_id',
+)
+EXPORT_DOCUMENT_FIELDS = (
+    'id', 'document_number', 'currency', 'amount', 'amount_dop', 'tax',
+    'status__name',
+)
+# document type -> (model, {column of EXPORT_DOCUMENT_FIELDS: field})
+EXPORT_DOCUMENTS = (
+    ('invoice', models.Invoice, {}),
+    ('advancepayment', models.AdvancePayment, {
+        'document_number': 'concept_id', 'amount_dop': None, 'tax': None}),
+    ('item', models.Item, {'document_number': 'number'}),
+)
+EXPORT_COLUMNS = (
+    tuple(f'payment_attempt_{field}'.replace('__', '_')
+          for field in EXPORT_ATTEMPT_FIELDS) +
+    ('document_type',) +
+    tuple(f'document_{field}'.replace('__', '_')
+          for field in EXPORT_DOCUMENT_FIELDS)
+)
+
+
+def chunked_values(queryset, fields, chunk_size):
+    """
+    values_list of the queryset in primary key order, chunk_size rows
+    per query. The MySQL driver loads the whole result of a query
+    (QuerySet.iterator does not stream there), reading it by keyset
+    chunks keeps the memory flat whatever the number of rows.
+    """
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(chunk.values_list('pk', *fields)[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][0]
+
+
+def export_payment_attempts(attempts, chunk_size=None):
+    """
+    Flat rows of the payment attempts, one per invoice, advance payment
+    and item with the columns of its attempt, and one for each attempt
+    without documents.
+    """
+    chunk_size = chunk_size or settings.PAYMENT_EXPORT_CHUNK_SIZE
+    attempt_ids = attempts.order_by().values('pk')
+    attempt_fields = [
+        f'payment_attempt__{field}' for field in EXPORT_ATTEMPT_FIELDS]
+
+    for document_type, model, renamed in EXPORT_DOCUMENTS:
+        document_fields = [
+            renamed.get(field, field) for field in EXPORT_DOCUMENT_FIELDS]
+        rows = chunked_values(
+            model.objects.filter(payment_attempt__in=attempt_ids),
+            attempt_fields + [field for field in document_fields if field],
+            chunk_size)
+        for row in rows:
+            values = iter(row)
+            yield dict(zip(EXPORT_COLUMNS, (
+                [next(values) for _ in attempt_fields] +
+                [document_type] +
+                [next(values) if field else None
+                 for field in document_fields])))
+
+    without_documents = models.PaymentAttempt.objects.filter(
+        pk__in=attempt_ids,
+        invoices__isnull=True,
+        advancepayments__isnull=True,
+        items__isnull=True)
+    for row in chunked_values(
+            without_documents, EXPORT_ATTEMPT_FIELDS, chunk_size):
+        values = dict.fromkeys(EXPORT_COLUMNS)
+        values.update(zip(EXPORT_COLUMNS, row))
+        yield values
+
+
+class Echo:
+    """File-like object that returns what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def render_csv(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_COLUMNS)
+    yield writer.writerow(dict(zip(EXPORT_COLUMNS, EXPORT_COLUMNS)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# output -> (content type, renderer of the rows)
+EXPORT_RENDERERS = {
+    'ndjson': ('application/x-ndjson', render_ndjson),
+    'csv': ('text/csv', render_csv),
+}
+
+
 def save_request_to_azul(payment_attempt, transaction):
         azul_data = transaction.get_data()
         data = {azul.convert(key): value for key, value in azul_data.items()}
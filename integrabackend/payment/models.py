@@ -1,10 +1,14 @@
 import uuid
 import decimal
+from datetime import timedelta
 from django.contrib.contenttypes.fields import GenericRelation, GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
-from integrabackend.contrib.models import BaseStatus
+from integrabackend.contrib.models import BaseSequence, BaseStatus
 from . import enums
 
 
@@ -24,6 +28,16 @@ class StatusCompensation(BaseStatus):
     pass
 
 
+class Sequence(BaseSequence):
+    pass
+
+
+def last_transaction():
+    last = PaymentAttempt.objects.aggregate(
+        last=models.Max('transaction')).get('last')
+    return last or 0
+
+
 class CreditCard(models.Model):
     id = models.UUIDField(
         primary_key=True, default=uuid.uuid4, editable=False)
@@ -114,7 +128,7 @@ class PaymentAttempt(models.Model):
         max_length=50,
         blank=True, null=True
     )
-    transaction = models.IntegerField()
+    transaction = models.IntegerField(db_index=True)
     card_number = models.CharField(
         'Card Number', max_length=4, blank=True, null=True)
     card_brand = models.CharField(max_length=50, blank=True, null=True)
@@ -151,6 +165,13 @@ class PaymentAttempt(models.Model):
         "payment.StatusCompensation",
         on_delete=models.CASCADE, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['sap_customer', 'status_compensation', 'date']),
+            models.Index(fields=['-date', '-id']),
+        ]
+
     @property
     def total(self):
         invoice = self.total_invoice_amount
@@ -165,27 +186,59 @@ class PaymentAttempt(models.Model):
 
         return invoice + item + advancepayment
     
-    def get_total(self, foreign_key, field):
-        total = getattr(self, foreign_key).values(
-            field
-        ).aggregate(total=models.Sum(field)).get('total', 0)
-        return total if total else decimal.Decimal(0.00)
+    # (field, related documents, document column)
+    totals = (
+        ('total_advancepayment_amount', 'advancepayments', 'amount'),
+        ('total_invoice_amount', 'invoices', 'amount_dop'),
+        ('total_invoice_amount_usd', 'invoices', 'amount'),
+        ('total_invoice_tax', 'invoices', 'tax'),
+        ('total_item_amount_usd', 'items', 'amount'),
+        ('total_item_amount_dop', 'items', 'amount_dop'),
+        ('total_item_tax', 'items', 'tax'),
+    )
+
+    def get_total_expression(self, foreign_key, field):
+        model = self._meta.get_field(foreign_key).related_model
+        documents = model.objects.filter(
+            payment_attempt=models.OuterRef('pk')
+        ).order_by().values('payment_attempt').annotate(
+            total=models.Sum(field)
+        ).values('total')
+
+        output_field = self._meta.get_field('total_invoice_amount')
+        return Coalesce(
+            models.Subquery(documents, output_field=output_field),
+            models.Value(0), output_field=output_field)
+
+    def calculate_totals(self):
+        """
+        Recalculate the totals of invoices, advancepayments and items
+        in one query. Only call it when the documents change.
+        """
+        expressions = {
+            f'sum_{field}': self.get_total_expression(foreign_key, column)
+            for field, foreign_key, column in self.totals}
+
+        totals = PaymentAttempt.objects.filter(
+            pk=self.pk).values(**expressions).first() or dict()
+
+        for field, _, _ in self.totals:
+            total = totals.get(f'sum_{field}')
+            setattr(self, field, total or decimal.Decimal(0.00))
+
+    def update_totals(self):
+        self.calculate_totals()
+        self.save(update_fields=[field for field, _, _ in self.totals])
 
     def save(self, *args, **kwargs):
-        last = PaymentAttempt.objects.order_by('transaction').last()
-        if not last:
-            self.transaction = 1
-        else:
-            self.transaction = last.transaction + 1
-        
-        self.total_advancepayment_amount = self.get_total('advancepayments', 'amount')
-        self.total_invoice_amount = self.get_total('invoices', 'amount_dop')
-        self.total_invoice_amount_usd = self.get_total('invoices', 'amount')
-        self.total_invoice_tax = self.get_total('invoices', 'tax')
+        if self._state.adding and not self.transaction:
+            self.transaction = Sequence.next_value(
+                enums.SequenceEnums.transaction, initial=last_transaction)
 
-        self.total_item_amount_usd = self.get_total('items', 'amount')
-        self.total_item_amount_dop = self.get_total('items', 'amount_dop')
-        self.total_item_tax = self.get_total('items', 'tax')
+        if self._state.adding:
+            for field, _, _ in self.totals:
+                if getattr(self, field) is None:
+                    setattr(self, field, decimal.Decimal(0.00))
 
         return super(PaymentAttempt, self).save(*args, **kwargs)
 
@@ -236,6 +289,9 @@ class Invoice(PaymentDocument):
     exchange_rate = models.DecimalField(
         'Exchange rate', max_digits=7, decimal_places=5)
 
+    class Meta:
+        indexes = [models.Index(fields=['document_number', 'status'])]
+
 
 class AdvancePayment(PaymentDocument):
     concept_id = models.CharField('Concept', max_length=50)
@@ -251,4 +307,99 @@ class Item(PaymentDocument):
     tax = models.DecimalField('Tax', max_digits=10, decimal_places=2)
     amount_dop = models.DecimalField(max_digits=10, decimal_places=2)
     exchange_rate = models.DecimalField(
-        'Exchange rate', max_digits=7, decimal_places=5)
\ No newline at end of file
+        'Exchange rate', max_digits=7, decimal_places=5)
+
+
+def compensation_backoff(attempts):
+    """Seconds to wait before the next SAP compensation, doubling by try"""
+    return min(
+        settings.COMPENSATION_RETRY_BACKOFF * 2 ** max(attempts - 1, 0),
+        settings.COMPENSATION_RETRY_MAX_BACKOFF)
+
+
+class CompensationOutboxManager(models.Manager):
+
+    def enqueue(self, payment_attempt):
+        """Outbox row of the attempt, one per attempt whoever asks"""
+        outbox, _ = self.get_or_create(
+            payment_attempt=payment_attempt,
+            defaults=dict(
+                idempotency_key=f'compensation-{payment_attempt.pk}'))
+        return outbox
+
+    def claim(self, idempotency_key):
+        """
+        Lease the pending row for COMPENSATION_LEASE seconds, None when
+        it was compensated, is not due or another worker holds it.
+        """
+        now = timezone.now()
+        claimed = self.filter(
+            idempotency_key=idempotency_key,
+            status=CompensationOutbox.PENDING,
+            next_attempt__lte=now,
+        ).update(next_attempt=now + timedelta(
+            seconds=settings.COMPENSATION_LEASE))
+        if not claimed:
+            return None
+        return self.select_related('payment_attempt').get(
+            idempotency_key=idempotency_key)
+
+    def due(self):
+        return self.filter(
+            status=CompensationOutbox.PENDING,
+            next_attempt__lte=timezone.now())
+
+
+class CompensationOutbox(models.Model):
+    """
+    SAP compensation of an approved payment attempt, written by the
+    charge and delivered by tasks.compensate_payment_attempt.
+    """
+    PENDING = 'pending'
+    COMPENSATED = 'compensated'
+    # SAP may have compensated it, it needs a check before sending again
+    UNCONFIRMED = 'unconfirmed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (COMPENSATED, 'Compensated'),
+        (UNCONFIRMED, 'Unconfirmed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    payment_attempt = models.OneToOneField(
+        'payment.PaymentAttempt',
+        related_name='compensation_outbox',
+        on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = CompensationOutboxManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt'])]
+
+    def compensated(self):
+        self.status = self.COMPENSATED
+        self.last_error = ''
+        self.save(update_fields=['status', 'last_error'])
+
+    def unconfirmed(self, error):
+        """Leave it out of the retries until someone checks SAP"""
+        self.attempts += 1
+        self.status = self.UNCONFIRMED
+        self.last_error = str(error)
+        self.save(update_fields=['attempts', 'status', 'last_error'])
+
+    def failed(self, error):
+        """Record the error and return the seconds until the next try"""
+        self.attempts += 1
+        backoff = compensation_backoff(self.attempts)
+        self.last_error = str(error)
+        self.next_attempt = timezone.now() + timedelta(seconds=backoff)
+        self.save(update_fields=['attempts', 'last_error', 'next_attempt'])
+        return backoff
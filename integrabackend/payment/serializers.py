@@ -1,5 +1,6 @@
 import re
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 from rest_framework import serializers
 
@@ -54,6 +55,13 @@ class ItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'payment_attempt', 'status')
 
 
+class ErrorPaymentAttemptSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = models.ErrorPaymentAttempt
+        fields = ('id', 'id_sap', 'znumber', 'message')
+
+
 class PaymentUserSerializer(serializers.ModelSerializer):
     
     class Meta:
@@ -100,37 +108,40 @@ class PaymentAttemptSerializer(serializers.ModelSerializer):
             'transaction',
         )
 
-    def create(self, validated_data):
-        invoices = validated_data.pop('invoices', [])
-        advancepayments = validated_data.pop('advancepayments', [])
-        items = validated_data.pop('items', [])
+    # (field, serializer) of documents written with bulk_create
+    document_serializers = (
+        ('invoices', InvoiceSerializer),
+        ('advancepayments', AdvancePaymentSerializer),
+        ('items', ItemSerializer),
+    )
+    batch_size = 500
 
-        payment_attempt = super(PaymentAttemptSerializer, self).create(validated_data)
+    def create(self, validated_data):
+        documents = [
+            (serializer.Meta.model, validated_data.pop(field, []))
+            for field, serializer in self.document_serializers]
+
+        with transaction.atomic():
+            payment_attempt = super(
+                PaymentAttemptSerializer, self).create(validated_data)
+
+            status_pending = models.StatusDocument.objects.get_by_name(
+                'Pendiente')
+
+            for model, documents_data in documents:
+                model.objects.bulk_create(
+                    [model(payment_attempt=payment_attempt,
+                           status=status_pending,
+                           **document)
+                     for document in documents_data],
+                    batch_size=self.batch_size)
+
+            payment_attempt.update_totals()
+        return payment_attempt
 
-        status_pending, _ = models.StatusDocument.objects.get_or_create(
-            name='Pendiente'
-        )
 
-        def make_many(serializer, data):
-            serializer = serializer(data=data)
-            serializer.is_valid(raise_exception=True)
-
-            serializer.save(
-                payment_attempt=payment_attempt,
-                status=status_pending
-            )
-
-        for invoice in invoices:
-            make_many(InvoiceSerializer, invoice)
-        
-        for advancepayment in advancepayments:
-            make_many(AdvancePaymentSerializer, advancepayment)
-        
-        for item in items:
-            make_many(ItemSerializer, item)
-
-        payment_attempt.save()
-        return payment_attempt
+class PaymentAttemptDetailSerializer(PaymentAttemptSerializer):
+    errors = ErrorPaymentAttemptSerializer(many=True, read_only=True)
 
 
 class PaymentAttemptPaySerializer(serializers.Serializer):
@@ -0,0 +1,96 @@
+from celery.utils.log import get_task_logger
+from django.conf import settings
+
+from integrabackend.celery import app
+from oraculo.gods.exceptions import BadRequest
+
+from . import enums, helpers, models
+from .helpers import CompensationPayment
+
+
+logger = get_task_logger(__name__)
+
+
+@app.task(name='compensate_payment_attempt', bind=True,
+          max_retries=settings.COMPENSATION_MAX_RETRIES)
+def compensate_payment_attempt(self, idempotency_key):
+    """
+    Compensate in SAP the invoices of a charged payment attempt. The
+    outbox row leased by the key makes it run once per attempt, however
+    many times it is queued. Documents SAP rejects wait for
+    reconcile_compensations.
+
+    SAP never receives the key, so the compensation is only sent again
+    with exponential backoff when the request didn't reach SAP, or when
+    SAP still has the invoices open after a call whose answer was lost
+    (timeout). When that can't be told the row is left unconfirmed.
+    """
+    outbox = models.CompensationOutbox.objects.claim(idempotency_key)
+    if outbox is None:
+        logger.info(f'Compensation {idempotency_key} is not pending')
+        return False
+
+    payment_attempt = outbox.payment_attempt
+    try:
+        CompensationPayment(payment_attempt).commit()
+    except BadRequest as exception:
+        helpers.save_compensation_errors(payment_attempt, exception)
+        backoff = outbox.failed(exception)
+        logger.info(
+            f'SAP rejected compensation {idempotency_key}, '
+            f'reconciling in {backoff}s')
+        return False
+    except Exception as exception:
+        if not helpers.request_not_sent(exception):
+            confirmed = helpers.compensation_confirmed(payment_attempt)
+            if confirmed:
+                return compensated(outbox)
+            if confirmed is None:
+                outbox.unconfirmed(exception)
+                logger.error(
+                    f'Compensation {idempotency_key} may be done in SAP, '
+                    f'check it before setting it pending: {exception}')
+                return False
+
+        backoff = outbox.failed(exception)
+        if self.request.retries >= self.max_retries:
+            logger.exception(
+                f'Compensation {idempotency_key} failed, '
+                f'reconciling in {backoff}s')
+            return False
+        raise self.retry(exc=exception, countdown=backoff)
+
+    return compensated(outbox)
+
+
+def compensated(outbox):
+    helpers.set_compensation_status(outbox.payment_attempt, compensated=True)
+    outbox.compensated()
+    logger.info(f'Compensation {outbox.idempotency_key} done')
+    return True
+
+
+@app.task(name='reconcile_compensations')
+def reconcile_compensations(batch_size=None):
+    """
+    Queue the compensations due: outbox rows pending past their backoff
+    and approved attempts not compensated that have no outbox row
+    (charged before it existed or interrupted before writing it).
+    """
+    batch_size = batch_size or settings.COMPENSATION_RECONCILE_BATCH_SIZE
+
+    orphans = models.PaymentAttempt.objects.filter(
+        status_process_payment__name=enums.StatusProcessPayment.approved,
+        response__isnull=False,
+        status_compensation__name=enums.StatusCompensation.not_compensated,
+        compensation_outbox__isnull=True)
+    for payment_attempt in orphans[:batch_size]:
+        models.CompensationOutbox.objects.enqueue(payment_attempt)
+
+    keys = list(models.CompensationOutbox.objects.due().order_by(
+        'next_attempt').values_list('idempotency_key', flat=True)[:batch_size])
+    for idempotency_key in keys:
+        compensate_payment_attempt.delay(idempotency_key)
+
+    logger.info(f'{len(keys)} compensations queued')
+    return len(keys)
@@ -1,9 +1,13 @@
 import random
 
 from django.test import TestCase
+from mock import MagicMock
+from requests import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
 from integrabackend.resident.test.factories import ResidentFactory
 from . import factories
-from .. import helpers
+from .. import enums, helpers, models
 
 
 class TestCompensationPayment(TestCase):
@@ -51,4 +55,176 @@ class TestCompensationPayment(TestCase):
         
         for advance in data.get('advancepayment'):
             for key in keys_advance:
-                self.assertIn(key, advance)
\ No newline at end of file
+                self.assertIn(key, advance)
+
+class InvoiceSAP:
+
+    def __init__(self, document_number):
+        self._base = dict(document_number=document_number)
+
+
+class TestExcludePendingCompensation(TestCase):
+
+    def setUp(self):
+        self.payment_attempt = factories.PaymentAttemptFactory(
+            status_compensation=factories.StatusCompensationFactory(
+                name=enums.StatusCompensation.not_compensated))
+        status_invoice = factories.StatusDocumentFactory(
+            name=enums.StatusInvoices.not_compensated)
+
+        self.pending = [3, 4, 5]
+        for document_number in self.pending:
+            factories.InvoiceFactory(
+                payment_attempt=self.payment_attempt,
+                document_number=document_number,
+                status=status_invoice)
+
+    def test_exclude_consecutive_pending_invoices(self):
+        # GIVEN
+        invoices_sap = [
+            InvoiceSAP(document_number)
+            for document_number in ['1', '3', '4', '5', '6']]
+
+        # WHEN
+        invoices = helpers.exclude_pending_compensation(
+            self.payment_attempt.sap_customer, invoices_sap)
+
+        # THEN
+        self.assertEqual(
+            [invoice._base['document_number'] for invoice in invoices],
+            ['1', '6'])
+
+    def test_keep_invoices_of_other_customer(self):
+        # GIVEN
+        invoices_sap = [InvoiceSAP(number) for number in self.pending]
+
+        # WHEN
+        invoices = helpers.exclude_pending_compensation(
+            self.payment_attempt.sap_customer + 1, invoices_sap)
+
+        # THEN
+        self.assertEqual(invoices, invoices_sap)
+
+    def test_keep_invoices_compensated(self):
+        # GIVEN
+        models.Invoice.objects.update(
+            status=factories.StatusDocumentFactory(
+                name=enums.StatusInvoices.compensated))
+        invoices_sap = [InvoiceSAP(number) for number in self.pending]
+
+        # WHEN
+        invoices = helpers.exclude_pending_compensation(
+            self.payment_attempt.sap_customer, invoices_sap)
+
+        # THEN
+        self.assertEqual(invoices, invoices_sap)
+
+    def test_one_query_for_all_invoices(self):
+        # GIVEN
+        invoices_sap = [InvoiceSAP(number) for number in range(500)]
+
+        # WHEN
+        with self.assertNumQueries(1):
+            invoices = helpers.exclude_pending_compensation(
+                self.payment_attempt.sap_customer, invoices_sap)
+
+        # THEN
+        self.assertEqual(len(invoices), 500 - len(self.pending))
+
+    def test_no_query_without_invoices(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(helpers.exclude_pending_compensation(
+                self.payment_attempt.sap_customer, []), [])
+
+
+class TestCompensationConfirmed(TestCase):
+
+    def setUp(self):
+        self.payment_attempt = factories.PaymentAttemptFactory()
+        self.invoices = [
+            factories.InvoiceFactory(
+                payment_attempt=self.payment_attempt, document_number=number)
+            for number in (3, 6)]
+        self.erp_client_class = MagicMock()
+        self.erp_client = self.erp_client_class.return_value
+
+    def confirmed(self, *open_numbers):
+        self.erp_client.invoices.return_value = [
+            InvoiceSAP(str(number)) for number in open_numbers]
+        return helpers.compensation_confirmed(
+            self.payment_attempt, erp_client_class=self.erp_client_class)
+
+    def test_invoices_closed_in_sap(self):
+        self.assertIs(self.confirmed(9), True)
+
+    def test_invoices_open_in_sap(self):
+        self.assertIs(self.confirmed(3, 6, 9), False)
+
+    def test_part_of_the_invoices_open(self):
+        self.assertIsNone(self.confirmed(3))
+
+    def test_sap_unavailable(self):
+        self.erp_client.invoices.side_effect = ReadTimeout()
+        self.assertIsNone(helpers.compensation_confirmed(
+            self.payment_attempt, erp_client_class=self.erp_client_class))
+
+    def test_request_not_sent(self):
+        self.assertTrue(helpers.request_not_sent(ConnectTimeout()))
+        self.assertTrue(helpers.request_not_sent(ConnectionError(
+            MaxRetryError(None, '/', NewConnectionError(None, 'refused')))))
+        self.assertFalse(helpers.request_not_sent(ReadTimeout()))
+        self.assertFalse(helpers.request_not_sent(ConnectionError(
+            ProtocolError('Connection aborted.'))))
+
+
+class TestExportPaymentAttempts(TestCase):
+
+    def setUp(self):
+        self.invoice = factories.InvoiceFactory.create()
+        self.payment_attempt = self.invoice.payment_attempt
+        factories.AdvancePaymentFactory.create(
+            payment_attempt=self.payment_attempt)
+        factories.ItemFactory.create(payment_attempt=self.payment_attempt)
+        self.without_documents = factories.PaymentAttemptFactory.create()
+
+    def test_one_row_per_document(self):
+        # WHEN
+        rows = list(helpers.export_payment_attempts(
+            models.PaymentAttempt.objects.all()))
+
+        # THEN
+        types = sorted(
+            (row['document_type'] or '', str(row['payment_attempt_id']))
+            for row in rows)
+        self.assertEqual(types, [
+            ('', str(self.without_documents.id)),
+            ('advancepayment', str(self.payment_attempt.id)),
+            ('invoice', str(self.payment_attempt.id)),
+            ('item', str(self.payment_attempt.id)),
+        ])
+        for row in rows:
+            self.assertEqual(tuple(row), helpers.EXPORT_COLUMNS)
+
+        invoice = next(row for row in rows if row['document_type'] == 'invoice')
+        self.assertEqual(
+            invoice['document_document_number'], self.invoice.document_number)
+
+    def test_only_filtered_attempts(self):
+        rows = list(helpers.export_payment_attempts(
+            models.PaymentAttempt.objects.filter(
+                pk=self.without_documents.pk)))
+
+        self.assertEqual(len(rows), 1)
+
+    def test_read_in_chunks(self):
+        # GIVEN
+        factories.InvoiceFactory.create_batch(
+            4, payment_attempt=self.payment_attempt)
+
+        # WHEN
+        with self.assertNumQueries(3):
+            rows = list(helpers.chunked_values(
+                models.Invoice.objects.all(), ['document_number'], 2))
+
+        # THEN
+        self.assertEqual(len(rows), 5)
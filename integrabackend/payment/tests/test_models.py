@@ -0,0 +1,271 @@
+import threading
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from integrabackend.contrib.models import STATUS_REGISTRY
+
+from . import factories
+from .. import enums, models
+
+
+class TestPaymentAttemptTransaction(TestCase):
+
+    def test_transaction_is_assigned_on_insert(self):
+        # WHEN
+        first = factories.PaymentAttemptFactory.create()
+        second = factories.PaymentAttemptFactory.create()
+
+        # THEN
+        self.assertEqual(second.transaction, first.transaction + 1)
+
+    def test_transaction_not_change_on_update(self):
+        # GIVEN
+        payment_attempt = factories.PaymentAttemptFactory.create()
+        transaction = payment_attempt.transaction
+        factories.PaymentAttemptFactory.create()
+
+        # WHEN
+        payment_attempt.save()
+        payment_attempt.refresh_from_db()
+
+        # THEN
+        self.assertEqual(payment_attempt.transaction, transaction)
+
+    def test_sequence_start_after_last_transaction(self):
+        # GIVEN
+        factories.PaymentAttemptFactory.create(transaction=41)
+        models.Sequence.objects.all().delete()
+
+        # WHEN
+        payment_attempt = factories.PaymentAttemptFactory.create()
+
+        # THEN
+        self.assertEqual(payment_attempt.transaction, 42)
+
+
+class TestPaymentAttemptTransactionConcurrency(TransactionTestCase):
+    threads = 8
+    attempts_per_thread = 10
+
+    def run_in_threads(self, target):
+        errors = list()
+
+        def worker():
+            try:
+                for _ in range(self.attempts_per_thread):
+                    target()
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_concurrent_sequence_values_are_unique(self):
+        # GIVEN
+        values = list()
+
+        def allocate():
+            values.append(models.Sequence.next_value(
+                enums.SequenceEnums.transaction))
+
+        # WHEN
+        self.run_in_threads(allocate)
+
+        # THEN
+        total = self.threads * self.attempts_per_thread
+        self.assertEqual(sorted(values), list(range(1, total + 1)))
+
+    def test_concurrent_payment_attempts_get_unique_transaction(self):
+        # GIVEN
+        user = factories.UserFactory.create()
+
+        # WHEN
+        self.run_in_threads(
+            lambda: factories.PaymentAttemptFactory.create(user=user))
+
+        # THEN
+        transactions = models.PaymentAttempt.objects.values_list(
+            'transaction', flat=True)
+        self.assertEqual(
+            len(transactions), self.threads * self.attempts_per_thread)
+        self.assertEqual(len(set(transactions)), len(transactions))
+
+
+class TestPaymentAttemptTotals(TestCase):
+
+    def setUp(self):
+        self.payment_attempt = factories.PaymentAttemptFactory.create()
+
+        for _ in range(3):
+            factories.InvoiceFactory.create(
+                payment_attempt=self.payment_attempt,
+                amount=1, amount_dop=50, tax=2)
+            factories.AdvancePaymentFactory.create(
+                payment_attempt=self.payment_attempt, amount=10)
+            factories.ItemFactory.create(
+                payment_attempt=self.payment_attempt,
+                amount=5, amount_dop=250, tax=1)
+
+    def test_calculate_totals_with_one_query(self):
+        # WHEN
+        with self.assertNumQueries(1):
+            self.payment_attempt.calculate_totals()
+
+        # THEN
+        self.assertEqual(self.payment_attempt.total_invoice_amount, 150)
+        self.assertEqual(self.payment_attempt.total_invoice_amount_usd, 3)
+        self.assertEqual(self.payment_attempt.total_invoice_tax, 6)
+        self.assertEqual(
+            self.payment_attempt.total_advancepayment_amount, 30)
+        self.assertEqual(self.payment_attempt.total_item_amount_usd, 15)
+        self.assertEqual(self.payment_attempt.total_item_amount_dop, 750)
+        self.assertEqual(self.payment_attempt.total_item_tax, 3)
+        self.assertEqual(self.payment_attempt.total, 150 + 30 + 750)
+
+    def test_calculate_totals_without_documents(self):
+        # GIVEN
+        payment_attempt = factories.PaymentAttemptFactory.create()
+
+        # WHEN
+        payment_attempt.calculate_totals()
+
+        # THEN
+        for field, _, _ in payment_attempt.totals:
+            self.assertEqual(getattr(payment_attempt, field), 0)
+
+    def test_update_totals_persist_values(self):
+        # WHEN
+        self.payment_attempt.update_totals()
+        self.payment_attempt.refresh_from_db()
+
+        # THEN
+        self.assertEqual(self.payment_attempt.total, 150 + 30 + 750)
+
+    def test_save_not_recalculate_totals(self):
+        # GIVEN
+        self.payment_attempt.update_totals()
+        self.payment_attempt.process_payment = 'AZUL'
+
+        # WHEN / THEN
+        with self.assertNumQueries(1):
+            self.payment_attempt.save()
+
+
+@override_settings(STATUS_REGISTRY=True)
+class TestStatusRegistry(TestCase):
+
+    def setUp(self):
+        STATUS_REGISTRY.clear()
+        cache.clear()
+        self.manager = models.StatusCompensation.objects
+        self.status = self.manager.create(
+            name=enums.StatusCompensation.compensated)
+
+    def tearDown(self):
+        STATUS_REGISTRY.clear()
+
+    def test_warm_with_one_query(self):
+        # WHEN / THEN
+        with self.assertNumQueries(1):
+            warmed = self.manager.get_by_name(
+                enums.StatusCompensation.compensated)
+        self.assertEqual(warmed, self.status)
+
+    def test_get_by_name_without_queries(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN / THEN
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.manager.get_by_name(
+                    enums.StatusCompensation.compensated)
+
+    def test_unknown_name_is_created(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN
+        status = self.manager.get_by_name(
+            enums.StatusCompensation.not_compensated)
+
+        # THEN
+        self.assertTrue(self.manager.filter(pk=status.pk).exists())
+        self.assertEqual(
+            self.manager.get_by_name(enums.StatusCompensation.not_compensated),
+            status)
+        with self.assertNumQueries(0):
+            self.manager.get_by_name(enums.StatusCompensation.not_compensated)
+
+    def test_change_in_other_process_reload_rows(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN
+        cache.set(self.manager.version_key, 'changed', None)
+
+        # THEN
+        with self.assertNumQueries(1):
+            self.manager.get_by_name(enums.StatusCompensation.compensated)
+
+    def test_save_clear_registry(self):
+        # GIVEN
+        version = self.manager.warm()['version']
+
+        # WHEN
+        self.status.name = 'Renamed'
+        self.status.save()
+
+        # THEN
+        self.assertNotIn(self.manager.registry_key, STATUS_REGISTRY)
+        self.assertEqual(self.manager.get_by_name('Renamed'), self.status)
+        self.assertNotEqual(
+            STATUS_REGISTRY[self.manager.registry_key]['version'], version)
+
+    def test_delete_clear_registry(self):
+        # GIVEN
+        self.manager.warm()
+
+        # WHEN
+        self.status.delete()
+
+        # THEN
+        self.assertNotIn(self.manager.registry_key, STATUS_REGISTRY)
+
+
+@override_settings(STATUS_REGISTRY=True)
+class TestStatusRegistryTransaction(TransactionTestCase):
+
+    def setUp(self):
+        STATUS_REGISTRY.clear()
+        cache.clear()
+        self.manager = models.StatusCompensation.objects
+        self.manager.create(name=enums.StatusCompensation.compensated)
+        self.manager.warm()
+
+    def tearDown(self):
+        STATUS_REGISTRY.clear()
+
+    def test_miss_rolled_back_is_not_registered(self):
+        # WHEN
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self.manager.get_by_name('Rolled back')
+                raise ValueError
+
+        # THEN
+        self.assertFalse(self.manager.filter(name='Rolled back').exists())
+        registry = STATUS_REGISTRY.get(self.manager.registry_key)
+        self.assertNotIn('Rolled back', registry['statuses'] if registry else {})
+        self.assertIsNotNone(self.manager.get_by_name('Rolled back').pk)
+        self.assertTrue(self.manager.filter(name='Rolled back').exists())
@@ -0,0 +1,128 @@
+import os
+import time
+from unittest import skipUnless
+from urllib.parse import parse_qs, urlparse
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.pagination import Cursor
+from rest_framework.test import APITestCase
+
+from integrabackend.contrib.paginates import KeysetPaginate
+from ...users.test.factories import GroupFactory, UserFactory
+from .. import models
+from . import factories
+
+
+class TestKeysetPaginate(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('payment_attempt-list')
+        user = UserFactory.create()
+        user.groups.add(GroupFactory(name='Backoffice'))
+        self.client.force_authenticate(user=user)
+
+        factories.PaymentAttemptFactory.create_batch(7)
+        # Same date in every row, the cursor offset skips the rows read
+        date = models.PaymentAttempt.objects.first().date
+        models.PaymentAttempt.objects.update(date=date)
+
+    def walk(self, params):
+        ids = list()
+        url, pages = self.url, 0
+        while url:
+            response = self.client.get(url, params)
+            params = None
+            ids += [payment['id'] for payment in response.json()['results']]
+            url = response.json()['next']
+            pages += 1
+        return ids, pages
+
+    def test_without_cursor_list_everything(self):
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.json()), 7)
+
+    def test_cursor_walk_every_row_once(self):
+        # WHEN
+        ids, pages = self.walk({'cursor': '', 'page_size': 2})
+
+        # THEN
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(
+            set(ids),
+            {str(pk) for pk in models.PaymentAttempt.objects.values_list(
+                'pk', flat=True)})
+
+    @override_settings(CURSOR_PAGINATION='off')
+    def test_switch_off(self):
+        response = self.client.get(self.url, {'cursor': ''})
+        self.assertEqual(len(response.json()), 7)
+
+    @override_settings(CURSOR_PAGINATION='always')
+    def test_switch_always(self):
+        response = self.client.get(self.url, {'page_size': 5})
+        self.assertEqual(len(response.json()['results']), 5)
+
+
+@skipUnless(
+    os.getenv('PAGINATION_BENCHMARK_SIZE'),
+    'Set PAGINATION_BENCHMARK_SIZE to run the pagination benchmark')
+class TestKeysetPaginateBenchmark(APITestCase):
+    """
+    Latency of the first page against a deep one, the offset query of
+    the same depth is printed for reference. PAGINATION_BENCHMARK_SIZE
+    sets the rows, 500000 reaches page 10.000 of 50.
+    """
+    size = int(os.getenv('PAGINATION_BENCHMARK_SIZE', 0))
+    page_size = 50
+    # Times slower the deep page may be than the first one
+    slowdown = 3
+
+    def setUp(self):
+        self.url = reverse('payment_attempt-list')
+        user = UserFactory.create()
+        user.groups.add(GroupFactory(name='Backoffice'))
+        self.client.force_authenticate(user=user)
+
+        payment_attempt = factories.PaymentAttemptFactory.create()
+        models.PaymentAttempt.objects.bulk_create([
+            models.PaymentAttempt(
+                sap_customer=payment_attempt.sap_customer,
+                transaction=position,
+                user=payment_attempt.user,
+                status_compensation=payment_attempt.status_compensation)
+            for position in range(self.size)], batch_size=5000)
+
+    def cursor_at(self, depth):
+        paginator = KeysetPaginate()
+        paginator.base_url = self.url
+        row = models.PaymentAttempt.objects.order_by('-date', '-id')[depth]
+        position = paginator._get_position_from_instance(row, ['-date'])
+        url = paginator.encode_cursor(Cursor(
+            offset=0, reverse=False, position=position))
+        return parse_qs(urlparse(url).query)['cursor'][0]
+
+    def timed_get(self, cursor):
+        start = time.time()
+        response = self.client.get(
+            self.url, {'cursor': cursor, 'page_size': self.page_size})
+        elapsed = time.time() - start
+        self.assertTrue(response.json()['results'])
+        return elapsed
+
+    def test_benchmark_first_and_last_page(self):
+        depth = self.size - self.page_size
+        self.timed_get('')  # Warm up the caches of the first request
+        first = self.timed_get('')
+        deep = self.timed_get(self.cursor_at(depth))
+
+        start = time.time()
+        list(models.PaymentAttempt.objects.order_by('-date', '-id')[
+            depth:depth + self.page_size])
+        offset = time.time() - start
+
+        print(f'\npage 1 {first:.4f}s, page {depth // self.page_size + 1} '
+              f'{deep:.4f}s (offset query {offset:.4f}s)')
+
+        self.assertLess(deep, first * self.slowdown)
@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from integrabackend.contrib.testing import QueryPlanMixin
+from ...users.test.factories import GroupFactory, UserFactory
+from .. import helpers
+from . import factories
+
+
+class TestPaymentAttemptQueryPlan(QueryPlanMixin, APITestCase):
+
+    def setUp(self):
+        self.url = reverse('payment_attempt-list')
+        user = UserFactory.create()
+        user.groups.add(GroupFactory(name='Backoffice'))
+        self.client.force_authenticate(user=user)
+        self.invoice = factories.InvoiceFactory.create()
+        self.payment_attempt = self.invoice.payment_attempt
+
+    def create(self, size):
+        for _ in range(size):
+            invoice = factories.InvoiceFactory.create()
+            factories.AdvancePaymentFactory.create(
+                payment_attempt=invoice.payment_attempt)
+            factories.ItemFactory.create(payment_attempt=invoice.payment_attempt)
+            factories.ResponsePaymentAttempt.create(
+                payment_attempt=invoice.payment_attempt)
+
+    def add_documents(self, payment_attempt, size):
+        factories.InvoiceFactory.create_batch(
+            size, payment_attempt=payment_attempt)
+        factories.ItemFactory.create_batch(
+            size, payment_attempt=payment_attempt)
+        for number in range(size):
+            payment_attempt.errors.create(
+                id_sap='E', znumber=number, message='error')
+
+    def test_list_queries_constant(self):
+        queries = self.assertQueriesConstant(self.url, self.create)
+        self.assertNoFullScan(queries)
+
+    def test_retrieve_queries_constant(self):
+        # GIVEN
+        url = f'{self.url}{self.payment_attempt.pk}/'
+        self.add_documents(self.payment_attempt, 1)
+
+        # WHEN
+        first = self.capture(url)
+        self.add_documents(self.payment_attempt, 5)
+        second = self.capture(url)
+
+        # THEN
+        self.assertEqual(len(first), len(second))
+        self.assertNoFullScan(second)
+
+    def test_retrieve_render_errors(self):
+        # GIVEN
+        self.add_documents(self.payment_attempt, 2)
+
+        # WHEN
+        response = self.client.get(f'{self.url}{self.payment_attempt.pk}/')
+
+        # THEN
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertEqual(len(response.json()['invoices']), 3)
+
+    def test_filter_by_customer_and_compensation(self):
+        params = {
+            'sap_customer': self.payment_attempt.sap_customer,
+            'status_compensation': self.payment_attempt.status_compensation_id}
+        self.assertNoFullScan(self.capture(self.url, params))
+
+    def test_pending_compensation_documents(self):
+        with CaptureQueriesContext(connection) as context:
+            helpers.pending_compensation_documents(
+                self.payment_attempt.sap_customer)
+        self.assertNoFullScan(context.captured_queries)
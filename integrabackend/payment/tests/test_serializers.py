@@ -0,0 +1,104 @@
+import os
+import time
+from unittest import skipUnless
+
+from django.db import connection
+from django.forms.models import model_to_dict
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import factories
+from .. import models, serializers
+
+
+class PaymentAttemptDocumentsMixin(object):
+
+    def setUp(self):
+        self.user = factories.UserFactory.create()
+        self.invoice = model_to_dict(
+            factories.InvoiceFactory.create(),
+            exclude=['id', 'payment_attempt', 'status'])
+        self.advancepayment = model_to_dict(
+            factories.AdvancePaymentFactory.create(),
+            exclude=['id', 'payment_attempt', 'status'])
+        self.item = model_to_dict(
+            factories.ItemFactory.create(),
+            exclude=['id', 'payment_attempt', 'status'])
+
+    def build_data(self, size):
+        return {
+            'sap_customer': 4259,
+            'merchant_number': '39038540035',
+            'merchant_name': 'CENREX',
+            'invoices': [self.invoice] * size,
+            'advancepayments': [self.advancepayment] * size,
+            'items': [self.item] * size,
+        }
+
+    def create(self, size):
+        serializer = serializers.PaymentAttemptSerializer(
+            data=self.build_data(size))
+        serializer.is_valid(raise_exception=True)
+
+        with CaptureQueriesContext(connection) as context:
+            payment_attempt = serializer.save(user=self.user)
+        return payment_attempt, len(context.captured_queries)
+
+
+class TestPaymentAttemptSerializerBulkCreate(
+        PaymentAttemptDocumentsMixin, TestCase):
+    """
+    Documents are written with one bulk insert per type, so the number
+    of queries only grows with the batches, not with the documents.
+    """
+    sizes = (10, 100)
+
+    def test_create_documents_and_totals(self):
+        # WHEN
+        payment_attempt, _ = self.create(10)
+
+        # THEN
+        self.assertEqual(payment_attempt.invoices.count(), 10)
+        self.assertEqual(payment_attempt.advancepayments.count(), 10)
+        self.assertEqual(payment_attempt.items.count(), 10)
+
+        status_pending = models.StatusDocument.objects.get(name='Pendiente')
+        self.assertFalse(
+            payment_attempt.invoices.exclude(status=status_pending).exists())
+
+        payment_attempt.refresh_from_db()
+        self.assertEqual(
+            payment_attempt.total_advancepayment_amount,
+            10 * self.advancepayment.get('amount'))
+
+    def test_queries_not_grow_with_documents(self):
+        # WHEN
+        queries = [self.create(size)[1] for size in self.sizes]
+
+        # THEN
+        self.assertEqual(queries[0], queries[1])
+
+
+@skipUnless(
+    os.getenv('PAYMENT_DOCUMENTS_BENCHMARK_SIZE'),
+    'Set PAYMENT_DOCUMENTS_BENCHMARK_SIZE to run the bulk create benchmark')
+class TestPaymentAttemptSerializerBenchmark(
+        PaymentAttemptDocumentsMixin, TestCase):
+    """
+    Time and queries of a payment attempt with many documents,
+    PAYMENT_DOCUMENTS_BENCHMARK_SIZE sets the documents per type.
+    """
+    size = int(os.getenv('PAYMENT_DOCUMENTS_BENCHMARK_SIZE', 0))
+
+    def test_benchmark_bulk_create(self):
+        # WHEN
+        start = time.time()
+        payment_attempt, queries = self.create(self.size)
+        elapsed = time.time() - start
+
+        print(f'\n{self.size} documents per type: '
+              f'{queries} queries, {elapsed:.3f}s')
+
+        # THEN
+        self.assertEqual(payment_attempt.invoices.count(), self.size)
+        self.assertLess(queries, max(self.size // 10, 20))
@@ -0,0 +1,246 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from mock import patch
+from nose.tools import eq_, ok_
+
+from oraculo.gods.exceptions import BadRequest
+from requests import ConnectTimeout, ReadTimeout
+
+from integrabackend.resident.test.factories import ResidentFactory
+from . import factories
+from .. import enums, models, tasks
+
+
+@override_settings(
+    COMPENSATION_RETRY_BACKOFF=30, COMPENSATION_RETRY_MAX_BACKOFF=600)
+class TestCompensationOutbox(TestCase):
+
+    def setUp(self):
+        self.payment_attempt = factories.PaymentAttemptFactory()
+
+    def test_backoff_doubles_until_max(self):
+        eq_([models.compensation_backoff(attempts) for attempts in range(1, 7)],
+            [30, 60, 120, 240, 480, 600])
+
+    def test_enqueue_once_by_attempt(self):
+        # WHEN
+        outbox = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+        again = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+
+        # THEN
+        eq_(outbox, again)
+        eq_(outbox.idempotency_key,
+            f'compensation-{self.payment_attempt.pk}')
+
+    def test_enqueue_attempts_with_same_transaction(self):
+        # GIVEN
+        duplicate = factories.PaymentAttemptFactory(
+            transaction=self.payment_attempt.transaction)
+
+        # WHEN
+        outbox = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+        other = models.CompensationOutbox.objects.enqueue(duplicate)
+
+        # THEN
+        ok_(outbox != other)
+        eq_(other.payment_attempt, duplicate)
+
+    def test_claim_lease_the_row(self):
+        # GIVEN
+        outbox = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+
+        # WHEN
+        claimed = models.CompensationOutbox.objects.claim(outbox.idempotency_key)
+
+        # THEN
+        eq_(claimed, outbox)
+        self.assertIsNone(
+            models.CompensationOutbox.objects.claim(outbox.idempotency_key))
+
+    def test_failed_schedule_next_attempt(self):
+        # GIVEN
+        outbox = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+
+        # WHEN
+        outbox.failed(ConnectionError('SAP is down'))
+        backoff = outbox.failed(ConnectionError('SAP is down'))
+
+        # THEN
+        outbox.refresh_from_db()
+        eq_(backoff, 60)
+        eq_(outbox.attempts, 2)
+        eq_(outbox.last_error, 'SAP is down')
+        ok_(outbox.next_attempt > timezone.now() + timedelta(seconds=50))
+
+
+@patch('integrabackend.payment.tasks.CompensationPayment')
+class TestCompensatePaymentAttempt(TestCase):
+
+    def setUp(self):
+        user = factories.UserFactory()
+        ResidentFactory(user=user)
+        self.payment_attempt = factories.PaymentAttemptFactory(user=user)
+        factories.ResponsePaymentAttempt(payment_attempt=self.payment_attempt)
+        self.invoice = factories.InvoiceFactory(
+            payment_attempt=self.payment_attempt)
+        self.outbox = models.CompensationOutbox.objects.enqueue(
+            self.payment_attempt)
+
+    def test_compensate_once(self, compensation_payment):
+        # WHEN
+        ok_(tasks.compensate_payment_attempt(self.outbox.idempotency_key))
+        eq_(tasks.compensate_payment_attempt(self.outbox.idempotency_key), False)
+
+        # THEN
+        compensation_payment.return_value.commit.assert_called_once_with()
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.COMPENSATED)
+
+        self.payment_attempt.refresh_from_db()
+        eq_(self.payment_attempt.status_compensation.name,
+            enums.StatusCompensation.compensated)
+        self.invoice.refresh_from_db()
+        eq_(self.invoice.status.name, enums.StatusInvoices.compensated)
+
+    def test_sap_rejection_wait_for_reconciler(self, compensation_payment):
+        # GIVEN
+        compensation_payment.return_value.commit.side_effect = BadRequest(
+            '[{"error": [{"id": "F5", "znumber": 1, "message": "message"}]}]')
+
+        # WHEN
+        result = tasks.compensate_payment_attempt(self.outbox.idempotency_key)
+
+        # THEN
+        eq_(result, False)
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.PENDING)
+        eq_(self.outbox.attempts, 1)
+        ok_(self.payment_attempt.errors.filter(
+            id_sap='F5', znumber=1, message='message').exists())
+
+    @override_settings(COMPENSATION_RETRY_BACKOFF=0)
+    def test_sap_unreachable_retry_until_max(self, compensation_payment):
+        # GIVEN
+        compensation_payment.return_value.commit.side_effect = ConnectTimeout(
+            'SAP is down')
+        max_retries = tasks.compensate_payment_attempt.max_retries
+
+        # WHEN
+        tasks.compensate_payment_attempt.apply(
+            args=(self.outbox.idempotency_key,))
+
+        # THEN
+        eq_(compensation_payment.return_value.commit.call_count, max_retries + 1)
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.PENDING)
+        eq_(self.outbox.attempts, max_retries + 1)
+        eq_(self.outbox.last_error, 'SAP is down')
+
+    @patch('integrabackend.payment.helpers.compensation_confirmed')
+    def test_timeout_done_in_sap_is_not_sent_again(
+            self, compensation_confirmed, compensation_payment):
+        # GIVEN
+        compensation_confirmed.return_value = True
+        compensation_payment.return_value.commit.side_effect = ReadTimeout()
+
+        # WHEN
+        ok_(tasks.compensate_payment_attempt.apply(
+            args=(self.outbox.idempotency_key,)).get())
+
+        # THEN
+        compensation_payment.return_value.commit.assert_called_once_with()
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.COMPENSATED)
+        self.invoice.refresh_from_db()
+        eq_(self.invoice.status.name, enums.StatusInvoices.compensated)
+
+    @override_settings(COMPENSATION_RETRY_BACKOFF=0)
+    @patch('integrabackend.payment.helpers.compensation_confirmed')
+    def test_timeout_still_open_in_sap_is_retried(
+            self, compensation_confirmed, compensation_payment):
+        # GIVEN
+        compensation_confirmed.return_value = False
+        compensation_payment.return_value.commit.side_effect = [
+            ReadTimeout(), None]
+
+        # WHEN
+        tasks.compensate_payment_attempt.apply(
+            args=(self.outbox.idempotency_key,))
+
+        # THEN
+        eq_(compensation_payment.return_value.commit.call_count, 2)
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.COMPENSATED)
+
+    @patch('integrabackend.payment.helpers.compensation_confirmed')
+    def test_timeout_unknown_in_sap_is_left_unconfirmed(
+            self, compensation_confirmed, compensation_payment):
+        # GIVEN
+        compensation_confirmed.return_value = None
+        compensation_payment.return_value.commit.side_effect = ReadTimeout()
+
+        # WHEN
+        tasks.compensate_payment_attempt.apply(
+            args=(self.outbox.idempotency_key,))
+
+        # THEN
+        compensation_payment.return_value.commit.assert_called_once_with()
+        self.outbox.refresh_from_db()
+        eq_(self.outbox.status, models.CompensationOutbox.UNCONFIRMED)
+        eq_(models.CompensationOutbox.objects.due().count(), 0)
+
+
+@patch.object(tasks.compensate_payment_attempt, 'delay')
+class TestReconcileCompensations(TestCase):
+
+    def setUp(self):
+        self.payment_attempt = factories.PaymentAttemptFactory(
+            status_process_payment=models.StatusProcessPayment.objects.get_by_name(
+                enums.StatusProcessPayment.approved),
+            status_compensation=models.StatusCompensation.objects.get_by_name(
+                enums.StatusCompensation.not_compensated))
+        factories.ResponsePaymentAttempt(payment_attempt=self.payment_attempt)
+
+    def test_queue_attempts_without_outbox(self, delay):
+        # WHEN
+        eq_(tasks.reconcile_compensations(), 1)
+
+        # THEN
+        outbox = self.payment_attempt.compensation_outbox
+        delay.assert_called_once_with(outbox.idempotency_key)
+
+    def test_skip_attempts_without_compensation_status(self, delay):
+        # GIVEN
+        self.payment_attempt.status_compensation = None
+        self.payment_attempt.save()
+
+        # WHEN
+        eq_(tasks.reconcile_compensations(), 0)
+
+        # THEN
+        delay.assert_not_called()
+        ok_(not models.CompensationOutbox.objects.exists())
+
+    def test_skip_compensations_not_due(self, delay):
+        # GIVEN
+        outbox = models.CompensationOutbox.objects.enqueue(self.payment_attempt)
+        outbox.failed(ConnectionError('SAP is down'))
+
+        # WHEN
+        eq_(tasks.reconcile_compensations(), 0)
+
+        # THEN
+        delay.assert_not_called()
+
+    def test_skip_compensated(self, delay):
+        # GIVEN
+        models.CompensationOutbox.objects.enqueue(
+            self.payment_attempt).compensated()
+
+        # WHEN
+        eq_(tasks.reconcile_compensations(), 0)
+
+        # THEN
+        delay.assert_not_called()
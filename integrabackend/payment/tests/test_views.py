@@ -1,8 +1,9 @@
+import json
 from mock import patch, MagicMock
 from datetime import datetime, timedelta
 
 from django.forms.models import model_to_dict
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from nose.tools import eq_, ok_
 from rest_framework import status
@@ -336,7 +337,7 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
         self.client.force_authenticate(user=user)
 
         # THEN
-        with self.assertNumQueries(6):
+        with self.assertNumQueries(5):
             response = self.client.get(self.url)
 
     def test_can_list_payments_without_documents(self):
@@ -562,7 +563,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             enums.StatusProcessPayment.not_approved)
         self.assertIsNone(self.payment_attempt.status_compensation)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     def test_charge_payment_attempt_with_dinner_club(self, compensation_payment):
         # GIVEN
         compensation_payment_mock = MagicMock()
@@ -616,7 +618,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             invoice.status.name,
             enums.StatusInvoices.compensated)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     def test_charge_payment_attempt_with_amex(self, compensation_payment):
         # GIVEN
         compensation_payment_mock = MagicMock()
@@ -669,7 +672,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             invoice.status.name,
             enums.StatusInvoices.compensated)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_can_pay_payment_attempt_american_express(
             self, transaction_class, compensation_payment):
@@ -739,7 +743,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             invoice.payment_attempt.status_compensation.name,
             enums.StatusCompensation.compensated)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_sap_raise_bad_request(self, transaction_class, compensation_payment):
         transaction_response = MagicMock()
@@ -808,7 +813,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             id_sap='F5', znumber=1, message='message'
         ).exists())
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_can_pay_payment_attempt_with_card_object(
             self, transaction_class, compensation_payment):
@@ -899,7 +905,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
         # THEN
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_can_pay_payment_attempt_with_save_true(
             self, transaction_class, compensation_payment):
@@ -987,7 +994,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_can_pay_payment_attempt_with_card_uuid(
             self, transaction_class, compensation_payment):
@@ -1049,7 +1057,8 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             invoice.status.name,
             enums.StatusInvoices.compensated)
 
-    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_payments')
+    @override_settings(CELERY_ALWAYS_EAGER=True)
+    @patch('integrabackend.payment.tasks.CompensationPayment')
     @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
     def test_can_pay_payment_attempt_with_advancepayment(
             self, transaction_class, compensation_payment):
@@ -1114,6 +1123,98 @@ class TestPaymenetAttemptTestCase(APITestCase, TransactionTestCase):
             advancepayment.status.name,
             enums.StatusInvoices.compensated)
 
+    @patch('integrabackend.payment.tasks.CompensationPayment')
+    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_task')
+    @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
+    def test_charge_return_before_compensation(
+            self, transaction_class, compensation_task, compensation_payment):
+        # GIVEN
+        transaction_response = MagicMock()
+        transaction_response.response_code = '00'
+        transaction_response.authorization_code = 'OK200'
+        transaction_response.kwargs = MOCK_TRANSACTION_APROVE
+
+        transaction_class_mock = MagicMock()
+        transaction_class_mock.get_data.return_value = MOCK_REQUEST_TO_AZUL
+        transaction_class_mock.commit.return_value = transaction_response
+
+        transaction_class.return_value = transaction_class_mock
+
+        invoice = factories.InvoiceFactory(payment_attempt=self.payment_attempt)
+        url = '/api/v1/payment-attempt/%s/charge/' % self.payment_attempt.id
+        data = {
+            'card': {
+                'cvc': '977',
+                'expiration': '202012',
+                'name': 'Prueba',
+                'number': '4035874000424977',
+                'save': False
+            }
+        }
+
+        # WHEN
+        self.client.force_authenticate(user=self.resident.user)
+        response = self.client.post(url, data, format='json')
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json().get('success'))
+        compensation_payment.assert_not_called()
+
+        self.payment_attempt.refresh_from_db()
+        outbox = self.payment_attempt.compensation_outbox
+        compensation_task.delay.assert_called_once_with(outbox.idempotency_key)
+        eq_(outbox.status, models.CompensationOutbox.PENDING)
+
+        self.assertEqual(
+            self.payment_attempt.status_process_payment.name,
+            enums.StatusProcessPayment.approved)
+        self.assertEqual(
+            self.payment_attempt.status_compensation.name,
+            enums.StatusCompensation.not_compensated)
+
+        invoice.refresh_from_db()
+        self.assertEqual(
+            invoice.status.name,
+            enums.StatusInvoices.not_compensated)
+
+    @patch('integrabackend.payment.views.PaymentAttemptViewSet.compensation_task')
+    @patch('integrabackend.payment.views.PaymentAttemptViewSet.transaction_class')
+    def test_charge_keep_outbox_when_broker_is_down(
+            self, transaction_class, compensation_task):
+        # GIVEN
+        transaction_response = MagicMock()
+        transaction_response.response_code = '00'
+        transaction_response.authorization_code = 'OK200'
+        transaction_response.kwargs = MOCK_TRANSACTION_APROVE
+
+        transaction_class_mock = MagicMock()
+        transaction_class_mock.get_data.return_value = MOCK_REQUEST_TO_AZUL
+        transaction_class_mock.commit.return_value = transaction_response
+
+        transaction_class.return_value = transaction_class_mock
+        compensation_task.delay.side_effect = ConnectionError
+
+        url = '/api/v1/payment-attempt/%s/charge/' % self.payment_attempt.id
+        data = {
+            'card': {
+                'cvc': '977',
+                'expiration': '202012',
+                'name': 'Prueba',
+                'number': '4035874000424977',
+                'save': False
+            }
+        }
+
+        # WHEN
+        self.client.force_authenticate(user=self.resident.user)
+        response = self.client.post(url, data, format='json')
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ok_(models.CompensationOutbox.objects.due().filter(
+            payment_attempt=self.payment_attempt).exists())
+
 
 class TestVerifone(APITestCase):
 
@@ -1251,3 +1352,50 @@ class TestVerifone(APITestCase):
 
         self.assertIsNotNone(self.payment_attempt.request)
         self.assertIsNotNone(self.payment_attempt.response)
+
+
+class TestPaymentAttemptExport(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('payment_attempt-export')
+        user = UserFactory()
+        user.groups.add(GroupFactory(name='Backoffice'))
+        self.client.force_authenticate(user=user)
+        self.invoice = factories.InvoiceFactory.create()
+
+    def content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        # WHEN
+        response = self.client.get(self.url)
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        eq_(len(rows), 1)
+        eq_(rows[0]['document_type'], 'invoice')
+
+    def test_export_csv(self):
+        # WHEN
+        response = self.client.get(self.url, {'output': 'csv'})
+
+        # THEN
+        lines = self.content(response).splitlines()
+        eq_(len(lines), 2)
+        ok_(lines[0].startswith('payment_attempt_id,'))
+
+    def test_export_honor_date_range(self):
+        # GIVEN
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # WHEN
+        response = self.client.get(self.url, {'date_after': tomorrow})
+
+        # THEN
+        eq_(self.content(response), '')
+
+    def test_unknown_output(self):
+        response = self.client.get(self.url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
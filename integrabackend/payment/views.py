@@ -1,5 +1,7 @@
-import json
+import logging
 
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, status, viewsets
@@ -8,14 +10,16 @@ from rest_framework.exceptions import (APIException, NotFound, ParseError,
                                        PermissionDenied)
 from rest_framework.response import Response
 
-from oraculo.gods.exceptions import BadRequest
 from partenon.process_payment import azul
 
+from integrabackend.contrib.paginates import KeysetPaginate
 from ..solicitude.serializers import StateSerializer
 from ..users.models import User
 from ..users.permissions import IsVerifoneUserPermission
-from . import enums, filters, helpers, models, serializers
-from .helpers import CompensationPayment
+from . import enums, filters, helpers, models, serializers, tasks
+
+
+logger = logging.getLogger(__name__)
 
 
 class CreditCardViewSet(
@@ -71,8 +75,8 @@ class VerifoneViewSet(viewsets.ModelViewSet):
     status_process_payment = models.StatusProcessPayment.objects
 
     def perform_create(self, serializer):
-        status, _ = self.status_process_payment.get_or_create(
-            name=self.enums_process_payment.initial)
+        status = self.status_process_payment.get_by_name(
+            self.enums_process_payment.initial)
 
         serializer.save(
             user=self.request.user, status_process_payment=status)
@@ -102,7 +106,7 @@ class VerifoneViewSet(viewsets.ModelViewSet):
         if hasattr(self.object, 'request'):
             raise ParseError(detail='PaymentAttempt has one request')
             
-        self.object.save()    # refresh calculate fields
+        self.object.update_totals()
         if getattr(self.object, 'total') == 0:
             raise ParseError(
                 detail='Cant charge PaymentAttempt because total is cero')
@@ -111,8 +115,8 @@ class VerifoneViewSet(viewsets.ModelViewSet):
             self.object, self.get_azul_card(), many='item')
 
         if not transaction_response.is_valid():
-            status, _ = self.status_process_payment.get_or_create(
-                name=self.enums_process_payment.not_approved)
+            status = self.status_process_payment.get_by_name(
+                self.enums_process_payment.not_approved)
 
             self.object.status_process_payment = status
             self.object.save()
@@ -120,9 +124,8 @@ class VerifoneViewSet(viewsets.ModelViewSet):
             helpers.save_response_to_azul(self.object, transaction_response)
             return Response(transaction_response.kwargs, status=400)
         else:
-            status_process_payment, _ = models.StatusProcessPayment.objects.get_or_create(
-                name=self.enums_process_payment.approved
-            )
+            status_process_payment = models.StatusProcessPayment.objects.get_by_name(
+                self.enums_process_payment.approved)
             self.object.status_process_payment = status_process_payment
             self.object.save()
 
@@ -134,23 +137,38 @@ class VerifoneViewSet(viewsets.ModelViewSet):
         return Response(response_body)
 
 
+def serialized_prefetch(lookup, serializer_class):
+    """
+    Prefetch of ``lookup`` loading only the columns the serializer
+    renders, besides the keys the prefetch joins on.
+    """
+    model = serializer_class.Meta.model
+    rendered = set(serializer_class().fields)
+    columns = [
+        field.name for field in model._meta.concrete_fields
+        if field.name in rendered or field.primary_key or
+        field.related_model is models.PaymentAttempt]
+    return Prefetch(lookup, queryset=model.objects.only(*columns))
+
+
 class PaymentAttemptViewSet(viewsets.ModelViewSet):
     """
     Create resident
     """
-    queryset = models.PaymentAttempt.objects.select_related(
-        'user', 'response', 'request', 'status_compensation',
-        'status_process_payment'
-    ).prefetch_related('invoices').all()
+    queryset = models.PaymentAttempt.objects.all()
     card_class = azul.Card
-    compensation_payments = CompensationPayment
+    compensation_outbox_model = models.CompensationOutbox
+    compensation_task = tasks.compensate_payment_attempt
     credit_card_model = models.CreditCard
     filter_backends = [DjangoFilterBackend]
     filter_class = filters.PaymentAttemptFilter
+    pagination_class = KeysetPaginate
+    cursor_ordering = ('-date', '-id')
     request_payment_attemp_model = models.RequestPaymentAttempt
     response_payment_attemp_model = models.ResponsePaymentAttempt
     serialiser_pay_class = serializers.PaymentAttemptPaySerializer
     serializer_class = serializers.PaymentAttemptSerializer
+    serializer_detail_class = serializers.PaymentAttemptDetailSerializer
 
     enums_process_payment = enums.StatusProcessPayment
     enums_compensation = enums.StatusCompensation
@@ -160,8 +178,51 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
 
     transaction_class = azul.Transaction
 
+    # Relations the serializer of each action renders, the other
+    # actions keep the default plan
+    related = (
+        'response', 'request', 'status_compensation',
+        'status_process_payment')
+    rendered_prefetches = (
+        serialized_prefetch('user', serializers.PaymentUserSerializer),
+        serialized_prefetch('invoices', serializers.InvoiceSerializer),
+        serialized_prefetch(
+            'advancepayments', serializers.AdvancePaymentSerializer),
+        serialized_prefetch('items', serializers.ItemSerializer),
+    )
+    select_related_actions = {
+        'list': related,
+        'retrieve': related,
+        'update': related,
+        'partial_update': related,
+        'export': (),
+    }
+    prefetch_related_actions = {
+        'list': rendered_prefetches,
+        'retrieve': rendered_prefetches + (
+            serialized_prefetch(
+                'errors', serializers.ErrorPaymentAttemptSerializer),),
+        'update': rendered_prefetches,
+        'partial_update': rendered_prefetches,
+        'export': (),
+    }
+    default_select_related = ('user',) + related
+    default_prefetch_related = ('invoices',)
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return self.serializer_detail_class
+        return super(PaymentAttemptViewSet, self).get_serializer_class()
+
     def get_queryset(self):
         queryset = super(PaymentAttemptViewSet, self).get_queryset()
+        queryset = queryset.select_related(
+            *self.select_related_actions.get(
+                self.action, self.default_select_related)
+        ).prefetch_related(
+            *self.prefetch_related_actions.get(
+                self.action, self.default_prefetch_related))
+
         if (
             self.request.user.is_aplication
             or self.request.user.is_backoffice
@@ -177,10 +238,10 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
             serializer.save(user=get_object_or_404(User, self.request.data))
             return
 
-        status_process_payment, _ = self.status_process_payment.objects.get_or_create(
-            name=self.enums_process_payment.initial)
-        status_compensation, _ = self.status_compensation.objects.get_or_create(
-            name=self.enums_compensation.initial)
+        status_process_payment = self.status_process_payment.objects.get_by_name(
+            self.enums_process_payment.initial)
+        status_compensation = self.status_compensation.objects.get_by_name(
+            self.enums_compensation.initial)
 
         serializer.save(
             user=self.request.user,
@@ -251,10 +312,18 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
 
         return transaction.commit()
 
+    def queue_compensation(self, outbox):
+        # Requests run in autocommit, the outbox row is visible to the
+        # worker. When the broker is down reconcile_compensations queues it
+        try:
+            self.compensation_task.delay(outbox.idempotency_key)
+        except Exception:
+            logger.exception(
+                f'Cant queue compensation {outbox.idempotency_key}')
+
     def save_credit_card(self, transaction_response):
-        status, _ = models.StatusCreditcard.objects.get_or_create(
-            name='Valida'
-        )
+        status = models.StatusCreditcard.objects.get_by_name(
+            'Valida')
 
         self.credit_card_model.objects.create(
             brand=transaction_response.data_vault_brand,
@@ -267,6 +336,26 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
             token=transaction_response.data_vault_token,
         )
 
+    @action(detail=False, methods=['GET'])
+    def export(self, request):
+        """
+        Stream the filtered payment attempts as flat rows, one per
+        document, in ?output=ndjson (default) or csv.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in helpers.EXPORT_RENDERERS:
+            raise ParseError(detail=f'Output {output} is not supported')
+
+        content_type, render_rows = helpers.EXPORT_RENDERERS[output]
+        rows = helpers.export_payment_attempts(
+            self.filter_queryset(self.get_queryset()))
+
+        response = StreamingHttpResponse(
+            render_rows(rows), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="payment-attempts.{output}"')
+        return response
+
     @action(detail=True, methods=['POST'])
     def charge(self, request, pk=None):
         if self.request.user.is_backoffice:
@@ -279,20 +368,19 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
         if hasattr(self.object, 'request'):
             raise ParseError(detail='PaymentAttempt has one request')
 
-        self.object.save()    # refresh calculate fields
+        self.object.update_totals()
         transaction_response = self.make_transaction_in_azul()
         if not transaction_response.is_valid():
-            status, _ = self.status_process_payment.objects.get_or_create(
-                name=self.enums_process_payment.not_approved)
+            status = self.status_process_payment.objects.get_by_name(
+                self.enums_process_payment.not_approved)
 
             self.object.status_process_payment = status
             self.object.save()
 
             return Response(transaction_response.kwargs, status=400)
         else:
-            status_process_payment, _ = models.StatusProcessPayment.objects.get_or_create(
-                name=self.enums_process_payment.approved
-            )
+            status_process_payment = models.StatusProcessPayment.objects.get_by_name(
+                self.enums_process_payment.approved)
             self.object.status_process_payment = status_process_payment
             self.object.save()
 
@@ -305,33 +393,10 @@ class PaymentAttemptViewSet(viewsets.ModelViewSet):
         response_body = transaction_response.kwargs
         response_body.update(dict(success=True))
 
-        try:
-            compensation_payment = self.compensation_payments(self.object)
-            compensation_payment.commit()
-            status_invoice, _ = models.StatusDocument.objects.get_or_create(
-                name=enums.StatusInvoices.compensated)
-            self.object.invoices.update(status=status_invoice)
-            self.object.advancepayments.update(status=status_invoice)
-
-            status_compensation, _ = models.StatusCompensation.objects.get_or_create(
-                name=self.enums_compensation.compensated)
-            self.object.status_compensation = status_compensation
-            self.object.save()
-
-            return Response(response_body)
-        except BadRequest as exception:
-            status_invoice, _ = models.StatusDocument.objects.get_or_create(
-                name=enums.StatusInvoices.not_compensated)
-            self.object.invoices.update(status=status_invoice)
-            self.object.advancepayments.update(status=status_invoice)
-
-            status_compensation, _ = models.StatusCompensation.objects.get_or_create(
-                name=self.enums_compensation.not_compensated)
-            self.object.status_compensation = status_compensation
-            self.object.save()
+        # SAP compensates in the background, until then the attempt and
+        # its documents stay not compensated (hidden from the payable ones)
+        helpers.set_compensation_status(self.object, compensated=False)
+        self.queue_compensation(
+            self.compensation_outbox_model.objects.enqueue(self.object))
 
-            for error in json.loads(exception.args[0])[0].get('error'):
-                error['id_sap'] = error.pop('id')
-                self.object.errors.create(**error)
-
-            return Response(response_body)
+        return Response(response_body)
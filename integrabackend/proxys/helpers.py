@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+IGNORE_PARAMS = ('format', )
+
+
+def normalize_params(params):
+    """
+    Sorted (key, value) pairs of the query params without empty values,
+    so the same search with the params in other order hits the same entry.
+    """
+    if hasattr(params, 'lists'):
+        items = params.lists()
+    else:
+        items = ((key, [value]) for key, value in params.items())
+
+    normalized = list()
+    for key, values in items:
+        if key in IGNORE_PARAMS:
+            continue
+        for value in values:
+            if value is None:
+                continue
+            value = str(value).strip()
+            if value:
+                normalized.append((key, value))
+    return sorted(normalized)
+
+
+class ProxyCache:
+    """
+    TTL cache of the responses of an ERP proxy endpoint. An entry older
+    than its timeout is still served during PROXY_CACHE_STALE seconds
+    while one thread fetches it again from SAP.
+    """
+    prefix = 'proxy'
+
+    def __init__(self, endpoint, cache=cache):
+        self.endpoint = endpoint
+        self.cache = cache
+
+    @property
+    def timeout(self):
+        return settings.PROXY_CACHE_TIMEOUTS.get(self.endpoint)
+
+    @property
+    def version_key(self):
+        return f'{self.prefix}:{self.endpoint}:version'
+
+    @property
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, 1, None)
+            version = self.cache.get(self.version_key, 1)
+        return version
+
+    def key(self, params):
+        digest = hashlib.md5(
+            urlencode(normalize_params(params)).encode()).hexdigest()
+        return f'{self.prefix}:{self.endpoint}:{self.version}:{digest}'
+
+    def set(self, key, data):
+        entry = dict(data=data, expires=time.time() + self.timeout)
+        self.cache.set(
+            key, entry, self.timeout + settings.PROXY_CACHE_STALE)
+        return data
+
+    def refresh(self, key, fetch):
+        try:
+            self.set(key, fetch())
+        except Exception as exception:
+            logger.warning(
+                'Could not refresh %s: %s', self.endpoint, exception)
+        finally:
+            self.cache.delete(f'{key}:lock')
+
+    def revalidate(self, key, fetch):
+        if not self.cache.add(
+                f'{key}:lock', True, settings.PROXY_CACHE_STALE):
+            return
+
+        threading.Thread(
+            target=self.refresh, args=(key, fetch), daemon=True).start()
+
+    def get(self, params, fetch):
+        """
+        Return the cached response for the params, calling fetch on a
+        miss. Exceptions of fetch are not cached.
+        """
+        if not self.timeout:
+            return fetch()
+
+        key = self.key(params)
+        entry = self.cache.get(key)
+        if entry is None:
+            return self.set(key, fetch())
+
+        if entry['expires'] <= time.time():
+            self.revalidate(key, fetch)
+        return entry['data']
+
+    def purge(self):
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, 2, None)
+
+
+def purge_proxy_cache(endpoint=None):
+    endpoints = [endpoint] if endpoint else settings.PROXY_CACHE_TIMEOUTS
+    for name in endpoints:
+        ProxyCache(name).purge()
+    return list(endpoints)
@@ -0,0 +1,148 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from mock import MagicMock, patch
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from integrabackend.users.enums import GroupsEnums
+from integrabackend.users.test.factories import UserFactory
+
+from integrabackend.proxys import helpers
+
+PROXY_CACHE_TIMEOUTS = {'sap-exchange-rate': 60}
+
+
+@override_settings(PROXY_CACHE_TIMEOUTS=PROXY_CACHE_TIMEOUTS)
+class TestProxyCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.proxy_cache = helpers.ProxyCache('sap-exchange-rate')
+        self.fetch = MagicMock(return_value={'rate': 58.5})
+
+    def test_fetch_once_for_same_params(self):
+        # WHEN
+        for params in [{'b': '2', 'a': '1'}, {'a': ' 1 ', 'b': '2', 'c': ''}]:
+            data = self.proxy_cache.get(params, self.fetch)
+
+        # THEN
+        self.assertEqual(data, {'rate': 58.5})
+        self.fetch.assert_called_once()
+
+    def test_fetch_for_other_params(self):
+        # WHEN
+        self.proxy_cache.get({'a': '1'}, self.fetch)
+        self.proxy_cache.get({'a': '2'}, self.fetch)
+
+        # THEN
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_not_cache_exceptions(self):
+        # GIVEN
+        self.fetch.side_effect = [Exception('SAP down'), {'rate': 58.5}]
+
+        # WHEN
+        with self.assertRaises(Exception):
+            self.proxy_cache.get({}, self.fetch)
+        data = self.proxy_cache.get({}, self.fetch)
+
+        # THEN
+        self.assertEqual(data, {'rate': 58.5})
+
+    def test_endpoint_without_timeout_not_cached(self):
+        # GIVEN
+        proxy_cache = helpers.ProxyCache('client-info')
+
+        # WHEN
+        proxy_cache.get({}, self.fetch)
+        proxy_cache.get({}, self.fetch)
+
+        # THEN
+        self.assertEqual(self.fetch.call_count, 2)
+
+    @patch('integrabackend.proxys.helpers.threading.Thread')
+    def test_serve_stale_while_revalidate(self, mock_thread):
+        # GIVEN
+        self.proxy_cache.get({}, self.fetch)
+        key = self.proxy_cache.key({})
+        entry = cache.get(key)
+        entry['expires'] = 0
+        cache.set(key, entry)
+        self.fetch.return_value = {'rate': 59.0}
+
+        # WHEN
+        data = self.proxy_cache.get({}, self.fetch)
+        self.proxy_cache.get({}, self.fetch)
+
+        # THEN
+        self.assertEqual(data, {'rate': 58.5})
+        mock_thread.assert_called_once()
+
+        self.proxy_cache.refresh(key, self.fetch)
+        self.assertEqual(self.proxy_cache.get({}, self.fetch), {'rate': 59.0})
+
+    def test_purge(self):
+        # GIVEN
+        self.proxy_cache.get({}, self.fetch)
+
+        # WHEN
+        helpers.purge_proxy_cache('sap-exchange-rate')
+        self.proxy_cache.get({}, self.fetch)
+
+        # THEN
+        self.assertEqual(self.fetch.call_count, 2)
+
+
+@override_settings(PROXY_CACHE_TIMEOUTS=PROXY_CACHE_TIMEOUTS)
+class TestProxyCacheViewSet(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.client.force_authenticate(user=self.user)
+
+    @patch('integrabackend.proxys.views.APIClientERP')
+    def test_exchange_rate_call_sap_once(self, mock_erp_client):
+        # GIVEN
+        mock = MagicMock()
+        mock.get.return_value = {'rate': 58.5}
+        mock_erp_client.return_value = mock
+
+        # WHEN
+        for _ in range(3):
+            response = self.client.get('/api/v1/sap/exchange-rate/')
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'rate': 58.5})
+        mock.get.assert_called_once()
+
+    def test_purge_only_application_user(self):
+        # WHEN
+        response = self.client.post('/api/v1/sap/cache-purge/')
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_purge(self):
+        # GIVEN
+        self.user.groups.create(name=GroupsEnums.application)
+
+        # WHEN
+        response = self.client.post(
+            '/api/v1/sap/cache-purge/', {'endpoint': 'sap-exchange-rate'})
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'purged': ['sap-exchange-rate']})
+
+    def test_purge_unknown_endpoint(self):
+        # GIVEN
+        self.user.groups.create(name=GroupsEnums.application)
+
+        # WHEN
+        response = self.client.post(
+            '/api/v1/sap/cache-purge/', {'endpoint': 'unknown'})
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
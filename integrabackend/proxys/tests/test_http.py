@@ -0,0 +1,140 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from integrabackend.contrib import http
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    cookies = list()
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+
+    def do_GET(self):
+        StubHandler.cookies.append(self.headers.get('Cookie'))
+        if self.path == '/unavailable':
+            self.send_response(503)
+        else:
+            self.send_response(200)
+        if self.path == '/login':
+            self.send_header('Set-Cookie', 'sessionid=customer; Path=/')
+        body = b'{"success": true}'
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestPooledSession(SimpleTestCase):
+    calls = 200
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = StubServer(('127.0.0.1', 0), StubHandler)
+        cls.url = 'http://127.0.0.1:%s/' % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubHandler.connections = 0
+        StubHandler.cookies = list()
+        http.SESSIONS.clear()
+        cache.clear()
+
+    def test_reuse_connection(self):
+        # WHEN
+        for _ in range(10):
+            response = http.get(self.url)
+
+        # THEN
+        self.assertEqual(response.json(), {'success': True})
+        self.assertEqual(StubHandler.connections, 1)
+
+    def test_latency_metrics_by_upstream(self):
+        # WHEN
+        http.get(self.url)
+        http.get(self.url)
+
+        # THEN
+        metric = http.latency_metrics()[self.url.rstrip('/')]
+        self.assertEqual(metric['requests'], 2)
+        self.assertEqual(metric['errors'], 0)
+
+    def test_retry_unavailable_upstream(self):
+        # WHEN
+        with self.settings(HTTP_MAX_RETRIES=2, HTTP_BACKOFF_FACTOR=0):
+            response = http.get(self.url + 'unavailable')
+
+        # THEN
+        self.assertEqual(response.status_code, 503)
+        metric = http.latency_metrics()[self.url.rstrip('/')]
+        self.assertEqual(metric['errors'], 1)
+
+    def test_latency_metrics_are_in_the_shared_cache(self):
+        # WHEN
+        http.record_latency('http://sap', 0.2)
+        http.record_latency('http://sap', 0.4, error=True)
+
+        # THEN
+        self.assertEqual(cache.get(http.metric_key('http://sap', 'requests')), 2)
+        self.assertEqual(
+            http.latency_metrics()['http://sap'],
+            dict(requests=2, errors=1, avg=0.3, max=0.4))
+
+    def test_response_cookies_are_not_shared(self):
+        # WHEN
+        http.get(self.url + 'login')
+        http.get(self.url, cookies={'token': 'caller'})
+        http.get(self.url)
+
+        # THEN
+        self.assertEqual(StubHandler.cookies, [None, 'token=caller', None])
+
+    def test_pooled_requests_keep_module_attributes(self):
+        pooled = http.PooledRequests()
+        self.assertIs(pooled.exceptions, requests.exceptions)
+        self.assertIs(pooled.get, http.get)
+
+    def test_benchmark_against_connection_per_call(self):
+        # WHEN
+        start = time.time()
+        for _ in range(self.calls):
+            requests.get(self.url)
+        bare = time.time() - start
+        bare_connections = StubHandler.connections
+
+        StubHandler.connections = 0
+        start = time.time()
+        for _ in range(self.calls):
+            http.get(self.url)
+        pooled = time.time() - start
+
+        print(f'\n{self.calls} calls: bare {bare:.3f}s '
+              f'({bare_connections} connections), pooled {pooled:.3f}s '
+              f'({StubHandler.connections} connections)')
+
+        # THEN
+        self.assertEqual(bare_connections, self.calls)
+        self.assertEqual(StubHandler.connections, 1)
@@ -1,17 +1,19 @@
 import json
 import os
 
-import requests
+from django.conf import settings
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
 import xmltodict
+from integrabackend.contrib import http
 from integrabackend.proxys import filters
+from integrabackend.proxys.helpers import ProxyCache, purge_proxy_cache
 from integrabackend.solicitude import enums
 from integrabackend.solicitude.views import get_value_or_404
-from integrabackend.payment.models import Invoice
-from integrabackend.payment.enums import StatusCompensation, StatusInvoices
+from integrabackend.payment.helpers import exclude_pending_compensation
+from integrabackend.users.permissions import IsApplicationUserPermission
 from oraculo.gods.exceptions import BadRequest, NotFound, InternalServer
 from oraculo.gods.faveo import APIClient as APIClientFaveo
 from oraculo.gods.sita_db import APIClient as APIClientSitaDB
@@ -22,13 +24,14 @@ from partenon.helpdesk import HelpDesk
 
 class ClientInfoViewSet(viewsets.ViewSet):
     filter_backends = (filters.ClientInfoFilter, )
+    cache = ProxyCache('client-info')
 
     def list(self, request, format=None):
         params = request.query_params.dict()
         try:
             kwargs = {'client_number': params.get('client')}
-            erp_client = ERPClient(**kwargs)
-            return Response(erp_client.info())
+            return Response(self.cache.get(
+                kwargs, lambda: ERPClient(**kwargs).info()))
         except Exception as error:
             response = Response({'message': str(error)})
             response.status_code = 404
@@ -37,6 +40,7 @@ class ClientInfoViewSet(viewsets.ViewSet):
 
 class SearchClientViewSet(viewsets.ViewSet):
     filter_backends = (filters.SearchClientFilter, )
+    cache = ProxyCache('search-client')
 
     def list(self, request, format=None):
         params = request.query_params.dict()
@@ -44,8 +48,8 @@ class SearchClientViewSet(viewsets.ViewSet):
             kwargs = {
                 'client_code': params.get('code'),
                 'client_name': params.get('name')}
-            erp_client = ERPClient(**kwargs)
-            return Response(erp_client.search())
+            return Response(self.cache.get(
+                kwargs, lambda: ERPClient(**kwargs).search()))
         except Exception as error:
             response = Response({'message': str(error)})
             response.status_code = 404
@@ -86,6 +90,7 @@ class ClientAddEmailViewSet(viewsets.ViewSet):
 class ERPResidentsViewSet(viewsets.ViewSet):
     filter_backends = (filters.ERPResidentsFilter, )
     erp_entity_class = ERPResidents
+    cache = ProxyCache('sap-residents')
 
     def list(self, request, format=None):
         params = request.query_params.dict()
@@ -93,8 +98,8 @@ class ERPResidentsViewSet(viewsets.ViewSet):
             "client_sap": params.get('client_sap'),
             "name": params.get('name')}
         try:
-            erp_resident = self.erp_entity_class(**kwargs)
-            return Response(erp_resident.search())
+            return Response(self.cache.get(
+                kwargs, lambda: self.erp_entity_class(**kwargs).search()))
         except NotFound as exception:
             return Response({}, status.HTTP_404_NOT_FOUND)
 
@@ -102,12 +107,15 @@ class ERPResidentsViewSet(viewsets.ViewSet):
 class ERPResidentsPrincipalEmailViewSet(viewsets.ViewSet):
     filter_backends = (filters.ERPResidentsPrincipalEmailFilter, )
     erp_class = ERPResidents
+    cache = ProxyCache('sap-principal-email')
 
     def list(self, request, format=None):
         email = get_value_or_404(
             request.query_params.dict(), 'email', 'Not send email')
         try:
-            response = self.erp_class.get_principal_email(email)
+            response = self.cache.get(
+                {'email': email},
+                lambda: self.erp_class.get_principal_email(email))
             return Response(response, status.HTTP_200_OK)
         except NotFound:
             return Response({}, status.HTTP_404_NOT_FOUND)
@@ -218,12 +226,13 @@ class SitaFlightViewSet(viewsets.ViewSet):
             'Not send to on query params'
         )
         body = self.get_body(from_, to)
-        response = requests.post(self.url, data=body, headers=self._headers)
+        response = http.post(self.url, data=body, headers=self._headers)
         return Response(self.get_flight(xmltodict.parse(response.content)))
 
 
 class ERPClientViewSet(viewsets.ViewSet):
     erp_client_class = ERPClient
+    society_cache = ProxyCache('sap-society')
 
     @action(detail=True, methods=['GET'], url_path='invoices')
     def invoice(self, request, pk=None, format=None):
@@ -236,18 +245,7 @@ class ERPClientViewSet(viewsets.ViewSet):
 
             invoices_sap = erp_client.invoices(merchant=merchant, language=language)
 
-            invoices_not_compensated = Invoice.objects.filter(
-                payment_attempt__sap_customer=pk,
-                payment_attempt__status_compensation__name=StatusCompensation.not_compensated,
-                status__name=StatusInvoices.not_compensated
-            )
-
-            for index, invoice in enumerate(invoices_sap):
-                pending_compensated = invoices_not_compensated.filter(
-                    document_number=invoice._base.get('document_number'))
-                if not pending_compensated.exists():
-                    continue
-                invoices_sap.pop(index)
+            invoices_sap = exclude_pending_compensation(pk, invoices_sap)
 
             return Response([invoice._base for invoice in invoices_sap])
         except NotFound as exception:
@@ -303,13 +301,14 @@ class ERPClientViewSet(viewsets.ViewSet):
             merchant = get_value_or_404(
                 params, 'merchant', 'Not send merchant')
 
-            societies = APIClientERP().post(
-                'api_portal_clie/dame_soc_mercha',
-                {
-                    'sap_customer': pk,
-                    'merchant_number': merchant
-                }
-            )
+            data = {
+                'sap_customer': pk,
+                'merchant_number': merchant
+            }
+            societies = self.society_cache.get(
+                data,
+                lambda: APIClientERP().post(
+                    'api_portal_clie/dame_soc_mercha', data))
             return Response(societies)
         except NotFound as exception:
             return Response({}, status.HTTP_404_NOT_FOUND)
@@ -357,12 +356,12 @@ class TemporalInvoiceViewSet(viewsets.ViewSet):
 
 class ExchangeRateViewSet(viewsets.ViewSet):
     url = 'api_portal_clie/dolar_exchange'
+    cache = ProxyCache('sap-exchange-rate')
 
     def list(self, request):
         try:
-            return Response(
-                APIClientERP().get(self.url)
-            )
+            return Response(self.cache.get(
+                {}, lambda: APIClientERP().get(self.url)))
         except BadRequest as exception:
             error = dict(error=str(exception))
             return Response(error, status.HTTP_400_BAD_REQUEST)
@@ -370,4 +369,24 @@ class ExchangeRateViewSet(viewsets.ViewSet):
             error = dict(error=str(exception))
             return Response(
                 error,
-                status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+                status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ProxyCacheViewSet(viewsets.ViewSet):
+    permission_classes = [IsApplicationUserPermission]
+
+    def create(self, request, *args, **kwargs):
+        endpoint = request.data.get('endpoint')
+        if endpoint and endpoint not in settings.PROXY_CACHE_TIMEOUTS:
+            return Response(
+                {'endpoint': 'Unknown endpoint'},
+                status.HTTP_400_BAD_REQUEST)
+
+        return Response({'purged': purge_proxy_cache(endpoint)})
+
+
+class UpstreamMetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsApplicationUserPermission]
+
+    def list(self, request):
+        return Response(http.latency_metrics())
@@ -22,6 +22,9 @@ class Resident(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL, blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['sap_customer'])]
+
 
 class TypeIdentification(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -42,6 +45,13 @@ class Person(models.Model):
     type_identification = models.ForeignKey(
         'resident.TypeIdentification', on_delete=models.CASCADE)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Person, cls).from_db(db, field_names, values)
+        # Invitations of the person are reindexed only when it changes
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
 
 class PropertyType(models.Model):
     name = models.CharField(max_length=60)
@@ -62,6 +72,13 @@ class Property(models.Model):
     project = models.ForeignKey(
         "resident.Project", on_delete=models.CASCADE, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Property, cls).from_db(db, field_names, values)
+        # Invitations of the property are reindexed only when it changes
+        instance._loaded_address = instance.__dict__.get('address')
+        return instance
+
     @property
     def direction(self):
         return f'{self.address}'
@@ -20,6 +20,7 @@ from .serializers import (
     ResidentUserserializer, TypeIdenticationSerializer,
     AreaSerializer, ProjectSerializer, DepartmentSerializer,
     OrganizationSerializer)
+from integrabackend.contrib.paginates import KeysetPaginate
 from integrabackend.solicitude.views import get_value_or_404
 from integrabackend.users.models import Application, AccessApplication
 from integrabackend.users.tasks import send_access_email
@@ -36,6 +37,7 @@ class ResidentCreateViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filter_class = filters.ResidentFilter
     form_reset_class = PasswordResetForm
+    pagination_class = KeysetPaginate
 
     @action(detail=True, methods=['GET', 'POST', "DELETE"], url_path='property')
     def property(self, request, pk=None):
@@ -142,6 +144,7 @@ class PersonViewSet(viewsets.ModelViewSet):
     serializer_class = PersonSerializer
     filter_backends = (DjangoFilterBackend,)
     filter_fields = ('create_by',)
+    pagination_class = KeysetPaginate
 
     def perform_create(self, serializer):
         serializer.save(create_by=self.request.user)
@@ -161,6 +164,7 @@ class PropertyViewSet(viewsets.ModelViewSet):
     serializer_class = PropertySerializer
     filter_backends = (DjangoFilterBackend,)
     filter_fields = ('id_sap',)
+    pagination_class = KeysetPaginate
 
     def get_queryset(self, *args, **kwargs):
         all_property = super(PropertyViewSet, self).get_queryset(**kwargs)
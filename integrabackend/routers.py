@@ -8,7 +8,8 @@ from .resident.views import (AreaViewSet, DepartmentViewSet,
                              ProjectViewSet, PropertyTypeViewSet,
                              PropertyViewSet, ResidentCreateViewSet,
                              TypeIdentificationViewSet)
-from .solicitude.views import (AvisoViewSet, DayViewSet, ServiceRequestViewSet,
+from .solicitude.views import (AvisoViewSet, CreditMetricsViewSet,
+                               DayViewSet, ServiceRequestViewSet,
                                ServiceViewSet, StateSolicitudeServiceViewSet,
                                ServiceAPPViewSet)
 from .users.views import (AccessApplicationViewSet, ApplicationViewSet,
@@ -52,6 +53,8 @@ router.register(r'service-request', ServiceRequestViewSet)
 router.register(r'day', DayViewSet)
 router.register(
     r'aviso', AvisoViewSet, base_name='create_aviso')
+router.register(
+    r'credit-metrics', CreditMetricsViewSet, base_name='credit_metrics')
 
 
 # APP - Payment
@@ -144,6 +147,18 @@ router.register(
     base_name='sap_exchange_rate'
 )
 
+router.register(
+    r'sap/cache-purge',
+    proxys.ProxyCacheViewSet,
+    base_name='sap_cache_purge'
+)
+
+router.register(
+    r'upstream-metrics',
+    proxys.UpstreamMetricsViewSet,
+    base_name='upstream_metrics'
+)
+
 # WEBHOOK
 router.register(
     r'faveo-webhook',
@@ -1,18 +1,214 @@
 import base64
+from concurrent.futures import Future, ThreadPoolExecutor
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.mail import EmailMessage
 from django.conf import settings
 from partenon.helpdesk import (
     HelpDeskUser, Topics, Prioritys, Status, HelpDeskTicket, HelpDesk)
-from partenon.ERP import ERPAviso
+from partenon.ERP import ERPAviso, ERPClient
 from oraculo.gods import hermes 
+from celery.utils.log import get_task_logger
 from . import enums, models
 
+logger = get_task_logger(__name__)
+
 
 class ServiceRequestHasAviso(Exception):
     pass
 
 
+credit_executor = ThreadPoolExecutor(
+    max_workers=settings.CREDIT_CHECK_WORKERS,
+    thread_name_prefix='has-credit')
+
+
+CREDIT_UNKNOWN = 'unknown'
+CREDIT_METRICS = ('hits', 'misses', 'failures', 'short_circuits', 'timeouts')
+CREDIT_BREAKER_OPEN_KEY = 'has-credit:breaker:open'
+CREDIT_BREAKER_FAILURES_KEY = 'has-credit:breaker:failures'
+
+
+def credit_cache_key(sap_customer):
+    return f'has-credit:{sap_customer}'
+
+
+def credit_metric_key(name):
+    return f'has-credit:metrics:{name}'
+
+
+def incr_credit_metric(name, cache=cache):
+    key = credit_metric_key(name)
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def credit_metrics(cache=cache):
+    """
+    Counters of the credit checks shared by every process, failures are
+    the SAP errors swallowed returning the default verdict.
+    """
+    values = cache.get_many([credit_metric_key(name) for name in CREDIT_METRICS])
+    metrics = {
+        name: values.get(credit_metric_key(name), 0)
+        for name in CREDIT_METRICS}
+    lookups = metrics['hits'] + metrics['misses']
+    metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0
+    metrics['breaker_open'] = cache.get(CREDIT_BREAKER_OPEN_KEY) is not None
+    return metrics
+
+
+def record_credit_failure(cache=cache):
+    threshold = settings.CREDIT_BREAKER_THRESHOLD
+    if not threshold:
+        return
+
+    cache.add(CREDIT_BREAKER_FAILURES_KEY, 0, settings.CREDIT_BREAKER_TIMEOUT)
+    try:
+        failures = cache.incr(CREDIT_BREAKER_FAILURES_KEY)
+    except ValueError:
+        return
+
+    if failures >= threshold:
+        cache.set(
+            CREDIT_BREAKER_OPEN_KEY, True, settings.CREDIT_BREAKER_TIMEOUT)
+        cache.delete(CREDIT_BREAKER_FAILURES_KEY)
+
+
+def has_credit(
+        sap_customer, erp_client_class=ERPClient, cache=cache, default=True):
+    """
+    Return if the SAP customer can consume services. The verdict is
+    cached CREDIT_CACHE_TIMEOUT seconds and a SAP failure is cached
+    CREDIT_FAILURE_CACHE_TIMEOUT seconds as unknown. After
+    CREDIT_BREAKER_THRESHOLD failures SAP is not called for
+    CREDIT_BREAKER_TIMEOUT seconds. Unknown verdicts return the default.
+    """
+    key = credit_cache_key(sap_customer)
+    verdict = cache.get(key)
+    if verdict is not None:
+        incr_credit_metric('hits', cache)
+        return default if verdict == CREDIT_UNKNOWN else verdict
+
+    incr_credit_metric('misses', cache)
+    if cache.get(CREDIT_BREAKER_OPEN_KEY) is not None:
+        incr_credit_metric('short_circuits', cache)
+        return default
+
+    try:
+        erp_client = erp_client_class(**{'client_code': sap_customer})
+        verdict = bool(erp_client.has_credit().get('puede_consumir'))
+    except Exception as exception:
+        logger.warning(
+            'Credit check of %s failed: %s', sap_customer, exception)
+        incr_credit_metric('failures', cache)
+        record_credit_failure(cache)
+        cache.set(key, CREDIT_UNKNOWN, settings.CREDIT_FAILURE_CACHE_TIMEOUT)
+        return default
+
+    cache.delete(CREDIT_BREAKER_FAILURES_KEY)
+    cache.set(key, verdict, settings.CREDIT_CACHE_TIMEOUT)
+    return verdict
+
+
+def has_credit_async(
+        sap_customer, erp_client_class=ERPClient, cache=cache, default=True):
+    """
+    Start the credit check of the customer in the pool, so the caller
+    can do its database work while SAP answers.
+    """
+    cached = cache.get(credit_cache_key(sap_customer)) is not None
+    if cached or cache.get(CREDIT_BREAKER_OPEN_KEY) is not None:
+        future = Future()
+        future.set_result(
+            has_credit(sap_customer, erp_client_class, cache, default))
+        return future
+
+    return credit_executor.submit(
+        has_credit, sap_customer, erp_client_class, cache, default)
+
+
+def wait_credit(future, timeout=None, default=True):
+    """
+    Verdict of a credit check started with has_credit_async. When SAP
+    does not answer in CREDIT_CHECK_TIMEOUT seconds the default is
+    returned, the check keeps running and caches its verdict.
+    """
+    if timeout is None:
+        timeout = settings.CREDIT_CHECK_TIMEOUT
+
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        incr_credit_metric('timeouts')
+        return default
+
+
+helpdesk_executor = ThreadPoolExecutor(
+    max_workers=settings.HELPDESK_WORKERS,
+    thread_name_prefix='helpdesk')
+
+
+def ticket_miss_key(ticket_id):
+    return f'ticket-number:miss:{ticket_id}'
+
+
+def fetch_ticket_number(ticket_id, ticket_class=HelpDeskTicket):
+    try:
+        return ticket_class.get_specific_ticket(ticket_id).ticket_number
+    except Exception:
+        return ''
+
+
+def resolve_ticket_numbers(
+        service_requests,
+        fetch=fetch_ticket_number,
+        model=models.ServiceRequest,
+        cache=cache):
+    """
+    Fill the ticket number of the service requests that do not have it
+    yet, fetching them from the HelpDesk at the same time and storing
+    them so they are fetched only once. Tickets the HelpDesk does not
+    return are not asked again for TICKET_NUMBER_MISS_TIMEOUT seconds.
+    """
+    missing = [
+        service_request for service_request in service_requests
+        if service_request.ticket_id and not service_request.ticket_number]
+    if not missing:
+        return 0
+
+    misses = cache.get_many([
+        ticket_miss_key(service_request.ticket_id)
+        for service_request in missing])
+    missing = [
+        service_request for service_request in missing
+        if ticket_miss_key(service_request.ticket_id) not in misses]
+    if not missing:
+        return 0
+
+    ticket_numbers = helpdesk_executor.map(
+        fetch, [service_request.ticket_id for service_request in missing])
+
+    resolved = 0
+    not_found = dict()
+    for service_request, ticket_number in zip(missing, ticket_numbers):
+        if not ticket_number:
+            not_found[ticket_miss_key(service_request.ticket_id)] = True
+            continue
+        service_request.ticket_number = str(ticket_number)
+        model.objects.filter(pk=service_request.pk).update(
+            ticket_number=service_request.ticket_number)
+        resolved += 1
+
+    if not_found:
+        cache.set_many(not_found, settings.TICKET_NUMBER_MISS_TIMEOUT)
+    return resolved
+
+
 def generate_note(service_request):
     days = [day.name
             for day in service_request.date_service_request.day.all()]
@@ -47,6 +243,7 @@ def create_service_request(instance, helpdesk_class=HelpDesk):
             priority, topic, department)
 
         instance.ticket_id = ticket.ticket_id
+        instance.ticket_number = str(ticket.ticket_number or '')
         instance.save()
 
     if instance.service.generate_aviso:
@@ -81,8 +278,8 @@ def process_to_create_aviso(
         service_request.service.sap_code_service,
         require_quotation=service_request.require_quotation)
     if hasattr(aviso, 'aviso'):
-        state, _ = model_state.objects.get_or_create(
-            name=states.notice_created)
+        state = model_state.objects.get_by_name(
+            states.notice_created)
         service_request.aviso_id = aviso.aviso
         service_request.state = state
         service_request.save()
@@ -106,8 +303,8 @@ def make_quotation(
     model=models.Quotation,
     model_state=models.State,
     states=enums.StateEnums):
-    state_pending, _ = model_state.objects.get_or_create(
-        name=states.quotation.pending)
+    state_pending = model_state.objects.get_by_name(
+        states.quotation.pending)
     quotation_data = dict(
         service_request=service_request, state=state_pending)
     quotation, _ = model.objects.get_or_create(**quotation_data)
@@ -179,8 +376,8 @@ def client_valid_quotation(
     ticket.change_state(status_ticket)
 
     # UPDATE SERVICE REQUES STATE APROVE QUOTATION
-    state, _ = model_state.objects.get_or_create(
-        name=states.service_request.waith_valid_quotation)
+    state = model_state.objects.get_by_name(
+        states.service_request.waith_valid_quotation)
     service_request.state = state
     service_request.save()
 
@@ -197,8 +394,8 @@ def client_valid_work(
     work realized.
     """
     # UPDATE SERVICE REQUES STATE APROVE WORK 
-    state, _ = model_state.objects.get_or_create(
-        name=states.service_request.waith_valid_work)
+    state = model_state.objects.get_by_name(
+        states.service_request.waith_valid_work)
     service_request.state = state
     service_request.save()
 
@@ -227,14 +424,14 @@ def aprove_quotation(
         states.aviso.aprove_quotation)
     
     # UPDATE QUOTATION REGISTER
-    state_aprove, _ = model_state.objects.get_or_create(
-        name=states.quotation.approved)
+    state_aprove = model_state.objects.get_by_name(
+        states.quotation.approved)
     service_request.quotation.state = state_aprove
     service_request.quotation.save()
 
     # UPDATE SERVICE REQUEST STATE
-    state_service_request, _ = model_state.objects.get_or_create(
-        name=states.service_request.approve_quotation)
+    state_service_request = model_state.objects.get_by_name(
+        states.service_request.approve_quotation)
     service_request.state = state_service_request
     service_request.save()
 
@@ -246,8 +443,8 @@ def approve_work(
     """ Process for aprove work """
 
     # UPDATE SERVICE REQUEST STATE TO APPROVED
-    state, _ = model_state.objects.get_or_create(
-        name=states.service_request.approved)
+    state = model_state.objects.get_by_name(
+        states.service_request.approved)
     service_request.state = state
     service_request.save()
 
@@ -277,10 +474,10 @@ def reject_quotation(
         enums.AvisoEnums.reject_quotation)
 
     # UPDATE QUOTATION REGISTER
-    state_quotation_reject, _ = model_state.objects.get_or_create(
-        name=states.quotation.reject)
-    state_service_request, _ = model_state.objects.get_or_create(
-        name=states.service_request.reject_quotation)
+    state_quotation_reject = model_state.objects.get_by_name(
+        states.quotation.reject)
+    state_service_request = model_state.objects.get_by_name(
+        states.service_request.reject_quotation)
 
     service_request.quotation.state = state_quotation_reject
     service_request.state = state_service_request
@@ -359,8 +556,8 @@ def service_request_on_reject_work(
     states=enums.StateEnums.service_request):
 
     # UPDATE SERVICE REQUESTE STATE
-    state_service_request, _ = model_state.objects.get_or_create(
-        name=states.reject_work)
+    state_service_request = model_state.objects.get_by_name(
+        states.reject_work)
     service_request.state = state_service_request
     service_request.save()
 
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from integrabackend.solicitude import helpers, models
+
+
+class Command(BaseCommand):
+    help = 'Store the HelpDesk ticket number of the service requests without it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Service requests resolved per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pks = list(models.ServiceRequest.objects.filter(
+            ticket_id__isnull=False, ticket_number=''
+        ).values_list('pk', flat=True))
+
+        resolved = 0
+        for start in range(0, len(pks), batch_size):
+            batch = models.ServiceRequest.objects.filter(
+                pk__in=pks[start:start + batch_size])
+            resolved += helpers.resolve_ticket_numbers(batch)
+            self.stdout.write(
+                f'{min(start + batch_size, len(pks))}/{len(pks)} processed')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resolved} ticket numbers stored, '
+            f'{len(pks) - resolved} not found'))
@@ -5,6 +5,8 @@ from django.conf import settings
 from django.db import models
 from partenon.helpdesk import Topics, HelpDeskTicket
 
+from integrabackend.contrib.models import StatusManager
+
 day_name = list(calendar.day_name)
 CHOICE_DAY = [list(a) for a in zip(day_name, day_name)]
 
@@ -56,6 +58,8 @@ class State(models.Model):
         editable=False)
     name = models.CharField(max_length=60)
 
+    objects = StatusManager()
+
     def __str__(self):
         return self.name
 
@@ -76,6 +80,7 @@ class ServiceRequest(models.Model):
     email = models.EmailField()
     require_quotation = models.BooleanField(default=False)
     ticket_id = models.IntegerField(null=True)
+    ticket_number = models.CharField(max_length=32, blank=True, default='')
     aviso_id = models.IntegerField(null=True)
 
     service = models.ForeignKey("solicitude.Service", on_delete=models.CASCADE)
@@ -93,15 +98,12 @@ class ServiceRequest(models.Model):
     
     class Meta:
         ordering = ('-creation_date',)
+        indexes = [
+            models.Index(fields=['user', '-creation_date']),
+            models.Index(fields=['ticket_id']),
+            models.Index(fields=['aviso_id']),
+        ]
     
-    @property
-    def ticket_number(self):
-        try:
-            ticket = HelpDeskTicket.get_specific_ticket(self.ticket_id)
-            return ticket.ticket_number
-        except Exception:
-            return ''
-
     @property
     def ticket(self):
         if not self.ticket_id:
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from rest_framework import permissions
-from integrabackend.solicitude import models
+from integrabackend.solicitude import helpers, models
 from partenon.ERP import ERPClient
 
 
@@ -17,13 +17,8 @@ class HasCreditPermission(permissions.BasePermission):
                 return True
 
         try:
-            resident = request.user.resident
-            kwargs = {
-                'client_code': resident.sap_customer,
-            }
-            erp_client = ERPClient(**kwargs)
-            response = erp_client.has_credit()
-            has_credit = response.get('puede_consumir')
-            return has_credit
+            sap_customer = request.user.resident.sap_customer
         except Exception as error:
             return True
+
+        return helpers.has_credit(sap_customer, erp_client_class=ERPClient)
@@ -124,4 +124,5 @@ class ServiceRequestFaveo(ServiceRequestSerializer):
     class Meta:
         model = ServiceRequest
         fields = ServiceRequestSerializer.Meta.fields + ('ticket_id', 'user')
+        read_only_fields = ('ticket_number',)
 
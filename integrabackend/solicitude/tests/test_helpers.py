@@ -1,6 +1,10 @@
+import time
+
 from mock import patch, MagicMock
 from django.core import mail
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from nose.tools import eq_, ok_
 
 from .factories import (
@@ -10,7 +14,7 @@ from ...users.test.factories import UserFactory
 from integrabackend.resident.test.factories import (
     PropertyFactory, PropertyTypeFactory, DepartmentFactory,
     AreaFactory, ProjectFactory, OrganizationFactory)
-from .. import helpers
+from .. import helpers, models
 
 
 def create_service_request():
@@ -86,9 +90,243 @@ class TestCreateServiceRequest(TestCase):
         
         # THEN
         self.assertEqual(instance.ticket_id, 1)
+        self.assertEqual(instance.ticket_number, 'N1')
 
         user.create_user.assert_called()
         user.ticket.create.assert_called()
         helpdesk_class.topics.objects.get_by_name.assert_called()
         helpdesk_class.prioritys.objects.get_by_name.assert_called()
         
+
+
+@override_settings(
+    CREDIT_CACHE_TIMEOUT=60, CREDIT_CHECK_TIMEOUT=0.2,
+    CREDIT_FAILURE_CACHE_TIMEOUT=60,
+    CREDIT_BREAKER_THRESHOLD=2, CREDIT_BREAKER_TIMEOUT=60)
+class TestHasCredit(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.erp_client = MagicMock()
+        self.erp_client.return_value.has_credit.return_value = {
+            'puede_consumir': False}
+
+    def test_verdict_is_cached(self):
+        # WHEN
+        for _ in range(3):
+            verdict = helpers.has_credit(
+                '0007', erp_client_class=self.erp_client)
+
+        # THEN
+        self.assertFalse(verdict)
+        self.erp_client.return_value.has_credit.assert_called_once()
+
+    def test_async_run_while_caller_works(self):
+        # GIVEN
+        def slow_has_credit():
+            time.sleep(0.1)
+            return {'puede_consumir': True}
+        self.erp_client.return_value.has_credit.side_effect = slow_has_credit
+
+        # WHEN
+        start = time.time()
+        future = helpers.has_credit_async(
+            '0007', erp_client_class=self.erp_client)
+        time.sleep(0.1)
+        verdict = helpers.wait_credit(future)
+
+        # THEN
+        self.assertTrue(verdict)
+        self.assertLess(time.time() - start, 0.19)
+
+    def test_async_use_cached_verdict(self):
+        # GIVEN
+        helpers.has_credit('0007', erp_client_class=self.erp_client)
+
+        # WHEN
+        future = helpers.has_credit_async(
+            '0007', erp_client_class=self.erp_client)
+
+        # THEN
+        self.assertTrue(future.done())
+        self.assertFalse(helpers.wait_credit(future))
+        self.erp_client.return_value.has_credit.assert_called_once()
+
+    def test_timeout_return_default(self):
+        # GIVEN
+        def slow_has_credit():
+            time.sleep(0.5)
+            return {'puede_consumir': False}
+        self.erp_client.return_value.has_credit.side_effect = slow_has_credit
+
+        # WHEN
+        start = time.time()
+        verdict = helpers.wait_credit(helpers.has_credit_async(
+            '0007', erp_client_class=self.erp_client))
+
+        # THEN
+        self.assertTrue(verdict)
+        self.assertLess(time.time() - start, 0.4)
+
+    def test_sap_error_return_default(self):
+        # GIVEN
+        self.erp_client.return_value.has_credit.side_effect = Exception()
+
+        # WHEN
+        verdict = helpers.wait_credit(helpers.has_credit_async(
+            '0007', erp_client_class=self.erp_client))
+
+        # THEN
+        self.assertTrue(verdict)
+
+    def test_failure_is_cached(self):
+        # GIVEN
+        self.erp_client.return_value.has_credit.side_effect = Exception()
+
+        # WHEN
+        for _ in range(3):
+            verdict = helpers.has_credit(
+                '0007', erp_client_class=self.erp_client)
+
+        # THEN
+        self.assertTrue(verdict)
+        self.erp_client.return_value.has_credit.assert_called_once()
+        self.assertEqual(helpers.credit_metrics()['failures'], 1)
+
+    def test_failure_return_default(self):
+        # GIVEN
+        self.erp_client.return_value.has_credit.side_effect = Exception()
+
+        # WHEN
+        verdict = helpers.has_credit(
+            '0007', erp_client_class=self.erp_client, default=False)
+
+        # THEN
+        self.assertFalse(verdict)
+
+    def test_breaker_open_after_failures(self):
+        # GIVEN
+        self.erp_client.return_value.has_credit.side_effect = Exception()
+        helpers.has_credit('0001', erp_client_class=self.erp_client)
+        helpers.has_credit('0002', erp_client_class=self.erp_client)
+
+        # WHEN
+        verdict = helpers.has_credit('0003', erp_client_class=self.erp_client)
+
+        # THEN
+        self.assertTrue(verdict)
+        self.assertEqual(
+            self.erp_client.return_value.has_credit.call_count, 2)
+        metrics = helpers.credit_metrics()
+        self.assertTrue(metrics['breaker_open'])
+        self.assertEqual(metrics['short_circuits'], 1)
+
+    def test_hit_rate(self):
+        # WHEN
+        for _ in range(4):
+            helpers.has_credit('0007', erp_client_class=self.erp_client)
+
+        # THEN
+        metrics = helpers.credit_metrics()
+        self.assertEqual(metrics['hits'], 3)
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['hit_rate'], 0.75)
+
+
+class TestResolveTicketNumbers(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.service_requests = [create_service_request() for _ in range(3)]
+        self.fetch = MagicMock(side_effect=lambda ticket_id: f'N{ticket_id}')
+
+    def test_resolve_and_store_missing(self):
+        # WHEN
+        resolved = helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=self.fetch)
+
+        # THEN
+        self.assertEqual(resolved, 3)
+        for service_request in self.service_requests:
+            service_request.refresh_from_db()
+            self.assertEqual(
+                service_request.ticket_number,
+                f'N{service_request.ticket_id}')
+
+    def test_not_fetch_stored(self):
+        # GIVEN
+        helpers.resolve_ticket_numbers(self.service_requests, fetch=self.fetch)
+        self.fetch.reset_mock()
+
+        # WHEN
+        resolved = helpers.resolve_ticket_numbers(
+            models.ServiceRequest.objects.all(), fetch=self.fetch)
+
+        # THEN
+        self.assertEqual(resolved, 0)
+        self.fetch.assert_not_called()
+
+    def test_fetch_concurrently(self):
+        # GIVEN
+        def slow_fetch(ticket_id):
+            time.sleep(0.1)
+            return f'N{ticket_id}'
+
+        # WHEN
+        start = time.time()
+        helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=slow_fetch)
+
+        # THEN
+        self.assertLess(time.time() - start, 0.25)
+
+    def test_not_store_not_found(self):
+        # WHEN
+        resolved = helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=lambda ticket_id: '')
+
+        # THEN
+        self.assertEqual(resolved, 0)
+        self.assertEqual(
+            models.ServiceRequest.objects.filter(ticket_number='').count(), 3)
+
+    def test_not_fetch_not_found_again(self):
+        # GIVEN
+        not_found = MagicMock(return_value='')
+        helpers.resolve_ticket_numbers(self.service_requests, fetch=not_found)
+
+        # WHEN
+        resolved = helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=not_found)
+
+        # THEN
+        self.assertEqual(resolved, 0)
+        self.assertEqual(not_found.call_count, 3)
+
+    def test_fetch_not_found_after_timeout(self):
+        # GIVEN
+        helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=lambda ticket_id: '')
+        cache.delete_many([
+            helpers.ticket_miss_key(service_request.ticket_id)
+            for service_request in self.service_requests])
+
+        # WHEN
+        resolved = helpers.resolve_ticket_numbers(
+            self.service_requests, fetch=self.fetch)
+
+        # THEN
+        self.assertEqual(resolved, 3)
+
+    @patch.object(helpers.HelpDeskTicket, 'get_specific_ticket')
+    def test_backfill_command(self, mock_get_ticket):
+        # GIVEN
+        mock_get_ticket.side_effect = lambda ticket_id: MagicMock(
+            ticket_number=f'N{ticket_id}')
+
+        # WHEN
+        call_command('backfill_ticket_numbers', batch_size=2)
+
+        # THEN
+        self.assertFalse(
+            models.ServiceRequest.objects.filter(ticket_number='').exists())
@@ -0,0 +1,35 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from integrabackend.contrib.testing import QueryPlanMixin
+from ...users.test.factories import UserFactory
+from .factories import QuotationFactory, ServiceRequestFactory
+
+
+class TestServiceRequestQueryPlan(QueryPlanMixin, APITestCase):
+
+    def setUp(self):
+        self.url = reverse('servicerequest-list')
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+
+    def create(self, size, **kwargs):
+        for service_request in ServiceRequestFactory.create_batch(
+                size, user=self.user, ticket_number='1', **kwargs):
+            QuotationFactory.create(
+                service_request=service_request, state=service_request.state)
+
+    def test_list(self):
+        queries = self.assertQueriesConstant(self.url, self.create)
+        self.assertNoFullScan(queries)
+
+    def test_filter_by_ticket(self):
+        queries = self.assertQueriesConstant(
+            self.url, lambda size: self.create(size, ticket_id=1),
+            params={'ticket_id': 1})
+        self.assertNoFullScan(queries)
+
+    def test_order_by_creation_date(self):
+        self.create(1)
+        self.assertNoFullScan(
+            self.capture(self.url, {'ordering': '-creation_date'}))
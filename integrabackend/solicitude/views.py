@@ -23,6 +23,7 @@ from integrabackend.resident.serializers import ResidentSerializer
 from integrabackend.contrib import enums
 from integrabackend.message.models import Message
 from integrabackend.message.serializers import MessageSerializer
+from integrabackend.users.permissions import IsApplicationUserPermission
 
 
 class Http500(APIException):
@@ -80,24 +81,27 @@ class ServiceAPPViewSet(viewsets.ViewSet):
             return '', []
 
         resident = self.serializer_resident(
-            instance=self.request.user.resident,
             context=self.get_serializer_context())
-
-        if not resident.data.get('sap_customer'):
+        sap_customer = resident.get_sap_customer(self.request.user.resident)
+        if not sap_customer:
             return '', []
 
-        queryset = self.get_queryset() 
+        # SAP answers the credit check while the services are loaded
+        credit = helpers.has_credit_async(
+            sap_customer, erp_client_class=ERPClient)
+        services = list(self.get_queryset())
 
-        kwargs = { 'client_code': resident.data.get('sap_customer')}
-        erp_client = ERPClient(**kwargs)
-        if not erp_client.has_credit().get('puede_consumir'):
+        if not helpers.wait_credit(credit):
             code = enums.MessageCode.not_has_credit
             instance = Message.objects.get_or_create(code=code)
             message = MessageSerializer(
                 instance=instance, context={'request': self.request}) 
-            return message.data.get('message'), queryset.filter(skip_credit_validation=True)
+            services = [
+                service for service in services
+                if service.skip_credit_validation]
+            return message.data.get('message'), services
 
-        return '', queryset
+        return '', services
 
     def list(self, request, *args, **kwargs):
         msg, services = self.get_services_and_message()
@@ -107,6 +111,13 @@ class ServiceAPPViewSet(viewsets.ViewSet):
         return Response(data)
     
 
+class CreditMetricsViewSet(viewsets.ViewSet):
+    permission_classes = [IsApplicationUserPermission]
+
+    def list(self, request):
+        return Response(helpers.credit_metrics())
+
+
 class StateSolicitudeServiceViewSet(viewsets.ReadOnlyModelViewSet):
     """
     List solicitud service's status
@@ -129,7 +140,10 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
     """
     CRUD service request
     """
-    queryset = ServiceRequest.objects.all()
+    queryset = ServiceRequest.objects.select_related(
+        'service', 'state', '_property', 'date_service_request',
+        'quotation__state'
+    ).prefetch_related('date_service_request__day')
     serializer_class = ServiceRequestSerializer
     pagination_class = ServiceRequestPaginate
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
@@ -142,6 +156,18 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         if self.request.user.is_aplication:
             return queryset
         return queryset.filter(user=self.request.user)
+
+    def get_object(self):
+        instance = super(ServiceRequestViewSet, self).get_object()
+        if self.action == 'retrieve':
+            helpers.resolve_ticket_numbers([instance])
+        return instance
+
+    def paginate_queryset(self, queryset):
+        page = super(ServiceRequestViewSet, self).paginate_queryset(queryset)
+        if page is not None:
+            helpers.resolve_ticket_numbers(page)
+        return page
     
     def get_serializer_class(self):
         serializer_class = {
@@ -150,8 +176,8 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         return serializer_class.get(self.action, self.serializer_class) 
 
     def perform_create(self, serializer):
-        state_open, _ = State.objects.get_or_create(
-            name=StateEnums.service_request.draft)
+        state_open = State.objects.get_by_name(
+            StateEnums.service_request.draft)
 
         serializer.save(
             user=self.request.user,
@@ -159,8 +185,8 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
         tasks.create_service_request.delay(str(serializer.instance.id))
     
     def perform_create_faveo(self, serializer):
-        state_open, _ = State.objects.get_or_create(
-            name=StateEnums.service_request.draft)
+        state_open = State.objects.get_by_name(
+            StateEnums.service_request.draft)
         serializer.save(state=state_open)
         tasks.create_service_request.delay(str(serializer.instance.id))
 
@@ -207,6 +233,7 @@ class ServiceRequestViewSet(viewsets.ModelViewSet):
 
         instances = ServiceRequest.objects.filter(
             aviso_id=response.get('aviso'))
+        helpers.resolve_ticket_numbers(instances)
         serializer = ServiceRequestDetailSerializer(instances, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
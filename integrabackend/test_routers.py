@@ -0,0 +1,104 @@
+import factory
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from .contrib.testing import QueryPlanMixin
+from .invitation.test import factories as invitation_factories
+from .payment.tests import factories as payment_factories
+from .resident.test import factories as resident_factories
+from .routers import router
+from .solicitude.enums import StateEnums
+from .solicitude.tests import factories as solicitude_factories
+from .users.enums import GroupsEnums
+from .users.test import factories as users_factories
+
+# Factory of the rows listed by each model route, by router basename
+ROUTES = {
+    'user': users_factories.UserFactory,
+    'application': users_factories.ApplicationFactory,
+    'accessapplication': users_factories.AccessApplicationFactory,
+    'merchant': users_factories.MerchantFactory,
+    'area': resident_factories.AreaFactory,
+    'department': resident_factories.DepartmentFactory,
+    'resident': resident_factories.ResidentFactory,
+    'property': resident_factories.PropertyFactory,
+    'project': resident_factories.ProjectFactory,
+    'propertytype': resident_factories.PropertyTypeFactory,
+    'typeidentification': resident_factories.TypeIdentificationFactory,
+    'organization': resident_factories.OrganizationFactory,
+    'typeinvitation': invitation_factories.TypeInvitationFactory,
+    'statusinvitation': invitation_factories.StatusInvitationFactory,
+    'medio': invitation_factories.MedioFactory,
+    'color': invitation_factories.ColorFactory,
+    'person': resident_factories.PersonFactory,
+    'service': solicitude_factories.ServiceFactory,
+    'state': solicitude_factories.StateFactory,
+    'day': solicitude_factories.DayFactory,
+    'statusprocesspayment': payment_factories.StatusProcessPaymentFactory,
+    'statuscompensation': payment_factories.StatusCompensationFactory,
+    'paymentattempt': payment_factories.PaymentAttemptFactory,
+    'credit_card': payment_factories.CreditCardFactory,
+}
+
+# Fields the rows need to be listed by the route
+ROUTE_FIELDS = {
+    'state': dict(name=StateEnums.service_request.draft),
+    'day': dict(active=True),
+    'credit_card': dict(owner=factory.SubFactory(users_factories.UserFactory)),
+}
+
+# Model routes checked in their own app, with the rows they nest
+EXCLUDED = {
+    'invitation': 'invitation/test/test_query_plans.py',
+    'servicerequest': 'solicitude/tests/test_query_plans.py',
+    'payment_attempt': 'payment/tests/test_query_plans.py',
+}
+
+
+def model_routes():
+    """Basenames of the routes backed by a queryset"""
+    return {
+        basename for _, viewset, basename in router.registry
+        if getattr(viewset, 'queryset', None) is not None}
+
+
+class TestRouterQueryPlan(QueryPlanMixin, APITestCase):
+    """
+    List and detail of every model route in the router. Routes without
+    a queryset read SAP, Faveo, Sita or the cache and run no query.
+    """
+
+    def setUp(self):
+        self.user = users_factories.UserFactory.create()
+        for name in (
+                GroupsEnums.application, GroupsEnums.backoffice,
+                GroupsEnums.monitoring_center, GroupsEnums.verifone):
+            self.user.groups.add(users_factories.GroupFactory.create(name=name))
+        self.client.force_authenticate(user=self.user)
+
+    def test_every_model_route_is_checked(self):
+        unchecked = model_routes() - set(ROUTES) - set(EXCLUDED)
+        self.assertEqual(unchecked, set(), 'Model routes without query plan test')
+
+
+def list_test(basename):
+    def test(self):
+        url = reverse(f'{basename}-list')
+        queries = self.assertQueriesConstant(
+            url, lambda size: ROUTES[basename].create_batch(
+                size, **ROUTE_FIELDS.get(basename, {})))
+        self.assertNoFullScan(queries)
+    return test
+
+
+def detail_test(basename):
+    def test(self):
+        row = ROUTES[basename].create(**ROUTE_FIELDS.get(basename, {}))
+        url = reverse(f'{basename}-detail', args=[row.pk])
+        self.assertNoFullScan(self.capture(url))
+    return test
+
+
+for basename in ROUTES:
+    setattr(TestRouterQueryPlan, f'test_{basename}_list', list_test(basename))
+    setattr(TestRouterQueryPlan, f'test_{basename}_detail', detail_test(basename))
@@ -0,0 +1,38 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def access_application_cache_key(user_id, application_id):
+    return f'access-application:{user_id}:{application_id}'
+
+
+def has_access_application(user, application_id, cache=cache):
+    """
+    Return if the user has access to the application. The decision,
+    allow or deny, is shared between process through the cache.
+    """
+    if not user.pk:
+        return False
+
+    try:
+        application_id = uuid.UUID(str(application_id))
+    except ValueError:
+        return False
+
+    key = access_application_cache_key(user.pk, application_id)
+    has_access = cache.get(key)
+    if has_access is None:
+        has_access = user.accessapplication_set.filter(
+            application__id=application_id
+        ).exists()
+        cache.set(
+            key, has_access,
+            settings.APPLICATION_ACCESS_CACHE_TIMEOUT)
+    return has_access
+
+
+def clear_access_application(user_id, application_id, cache=cache):
+    cache.delete(access_application_cache_key(
+        user_id, uuid.UUID(str(application_id))))
@@ -5,10 +5,12 @@ from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import Group
 from django.utils.encoding import python_2_unicode_compatible
-from django.db.models.signals import post_save
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save)
 from rest_framework.authtoken.models import Token
 
 from . import enums
+from .helpers import clear_access_application
 
 @python_2_unicode_compatible
 class User(AbstractUser):
@@ -21,35 +23,39 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
     
+    @property
+    def group_names(self):
+        """
+        Names of the groups of the user, loaded with one query and
+        cached on the instance until the groups relation changes.
+        """
+        if not hasattr(self, '_group_names'):
+            self._group_names = frozenset(
+                self.groups.values_list('name', flat=True))
+        return self._group_names
+
+    def clear_group_names(self):
+        self.__dict__.pop('_group_names', None)
+
     @property
     def is_aplication(self):
-        return self.groups.filter(
-            name=enums.GroupsEnums.application
-        ).exists()
-    
+        return enums.GroupsEnums.application in self.group_names
+
     @property
     def is_backoffice(self):
-        return self.groups.filter(
-            name=enums.GroupsEnums.backoffice
-        ).exists()
+        return enums.GroupsEnums.backoffice in self.group_names
 
     @property
     def is_security_agent(self):
-        return self.groups.filter(
-            name=enums.GroupsEnums.security_agent
-        ).exists()
-    
+        return enums.GroupsEnums.security_agent in self.group_names
+
     @property
     def is_monitoring_center(self):
-        return self.groups.filter(
-            name=enums.GroupsEnums.monitoring_center
-        ).exists()
-    
+        return enums.GroupsEnums.monitoring_center in self.group_names
+
     @property
     def is_verifone(self):
-        return self.groups.filter(
-            name=enums.GroupsEnums.verifone
-        ).exists()
+        return enums.GroupsEnums.verifone in self.group_names
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -58,6 +64,15 @@ def create_auth_token(sender, instance=None, created=False, **kwargs):
         Token.objects.create(user=instance)
 
 
+@receiver(m2m_changed, sender=User.groups.through)
+def clear_group_names(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        instance.clear_group_names()
+
+
 class Merchant(models.Model):
     id = models.UUIDField(
         primary_key=True,
@@ -90,6 +105,21 @@ class AccessApplication(models.Model):
     details = models.ManyToManyField("users.AccessDetail")
 
 
+@receiver(pre_save, sender=AccessApplication)
+def clear_previous_access_application(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).values(
+        'user_id', 'application_id').first()
+    if previous:
+        clear_access_application(
+            previous.get('user_id'), previous.get('application_id'))
+
+
+@receiver(post_save, sender=AccessApplication)
+@receiver(post_delete, sender=AccessApplication)
+def clear_current_access_application(sender, instance, **kwargs):
+    clear_access_application(instance.user_id, instance.application_id)
+
+
 class AccessDetail(models.Model):
     id = models.UUIDField(
         primary_key=True,
@@ -1,6 +1,8 @@
 from rest_framework import permissions
 from django.conf import settings
 
+from .helpers import has_access_application
+
 
 class IsUserOrReadOnly(permissions.BasePermission):
     """
@@ -30,9 +32,7 @@ class ApplicationAuthorizeRest(permissions.BasePermission):
             return False
 
         try:
-            return request.user.accessapplication_set.filter(
-                application__id=application_id
-            ).exists()
+            return has_access_application(request.user, application_id)
         except Exception as exception:
             return False
 
@@ -0,0 +1,85 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..enums import GroupsEnums
+from .factories import GroupFactory, UserFactory
+
+
+class TestUserGroupNames(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.user.groups.add(GroupFactory(name=GroupsEnums.backoffice))
+
+    def test_resolve_all_roles_with_one_query(self):
+        # WHEN / THEN
+        with self.assertNumQueries(1):
+            self.assertFalse(self.user.is_aplication)
+            self.assertTrue(self.user.is_backoffice)
+            self.assertFalse(self.user.is_security_agent)
+            self.assertFalse(self.user.is_monitoring_center)
+            self.assertFalse(self.user.is_verifone)
+
+    def test_add_group_clear_cache(self):
+        # GIVEN
+        self.assertFalse(self.user.is_aplication)
+
+        # WHEN
+        self.user.groups.create(name=GroupsEnums.application)
+
+        # THEN
+        self.assertTrue(self.user.is_aplication)
+
+    def test_remove_group_clear_cache(self):
+        # GIVEN
+        self.assertTrue(self.user.is_backoffice)
+
+        # WHEN
+        self.user.groups.remove(self.user.groups.first())
+
+        # THEN
+        self.assertFalse(self.user.is_backoffice)
+
+    def test_clear_groups_clear_cache(self):
+        # GIVEN
+        self.assertTrue(self.user.is_backoffice)
+
+        # WHEN
+        self.user.groups.clear()
+
+        # THEN
+        self.assertFalse(self.user.is_backoffice)
+
+
+class TestRoleQueriesPerEndpoint(APITestCase):
+    """
+    Queries spent resolving roles on the endpoints that check more than
+    one group per request. Before the roles were memoized every check
+    was one query (2 on payment-attempt, 3 on invitation).
+    """
+
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.client.force_authenticate(user=self.user)
+
+    def count_group_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len([
+            query for query in context.captured_queries
+            if 'auth_group' in query['sql']])
+
+    def test_payment_attempt_list(self):
+        self.user.groups.create(name=GroupsEnums.backoffice)
+        self.assertEqual(
+            self.count_group_queries('/api/v1/payment-attempt/'), 1)
+
+    def test_invitation_list(self):
+        self.user.groups.create(name=GroupsEnums.security_agent)
+        self.assertEqual(
+            self.count_group_queries('/api/v1/invitation/'), 1)
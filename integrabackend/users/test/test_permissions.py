@@ -1,7 +1,9 @@
 from django.urls import reverse
 from rest_framework import status
 
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 
 from . import factories
@@ -45,4 +47,73 @@ class TestApplicationAuthorize(TestCase):
         response = self.client.get(self.url, **header)
 
         # THEN
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+@override_settings(VALID_APPLICATION=True)
+class TestApplicationAuthorizeCache(TestCase):
+
+    def setUp(self):
+        self.user = factories.UserFactory.create()
+        self.client.force_login(self.user)
+
+        self.url = '/api/v1/'
+        self.application = factories.ApplicationFactory.create()
+        self.header = {
+            'HTTP_APPLICATION': 'Bifrost %s' % str(self.application.id)}
+
+    def test_decision_is_cached_between_requests(self):
+        # GIVEN
+        factories.AccessApplicationFactory(
+            user=self.user, application=self.application)
+        self.client.get(self.url, **self.header)
+
+        # WHEN
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, **self.header)
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for query in context.captured_queries:
+            self.assertNotIn('users_accessapplication', query['sql'])
+
+    def test_create_access_clear_deny_decision(self):
+        # GIVEN
+        response = self.client.get(self.url, **self.header)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        # WHEN
+        factories.AccessApplicationFactory(
+            user=self.user, application=self.application)
+        response = self.client.get(self.url, **self.header)
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_access_clear_allow_decision(self):
+        # GIVEN
+        access = factories.AccessApplicationFactory(
+            user=self.user, application=self.application)
+        response = self.client.get(self.url, **self.header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # WHEN
+        access.delete()
+        response = self.client.get(self.url, **self.header)
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_change_access_user_clear_allow_decision(self):
+        # GIVEN
+        access = factories.AccessApplicationFactory(
+            user=self.user, application=self.application)
+        response = self.client.get(self.url, **self.header)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # WHEN
+        access.user = factories.UserFactory.create()
+        access.save()
+        response = self.client.get(self.url, **self.header)
+
+        # THEN
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
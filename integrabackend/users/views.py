@@ -5,6 +5,7 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
+from integrabackend.contrib.paginates import KeysetPaginate
 from .models import (AccessApplication, AccessDetail, Application, Merchant,
                      User)
 from .permissions import (IsApplicationUserPermission,
@@ -21,6 +22,7 @@ class UserViewSet(viewsets.ModelViewSet):
     serializer_class = UserSerializer
     filter_backends = (DjangoFilterBackend,)
     filter_fields = ('username', 'email')
+    pagination_class = KeysetPaginate
 
 
 class ApplicationViewSet(viewsets.ModelViewSet):
@@ -42,6 +44,7 @@ class AccessApplicationViewSet(viewsets.ReadOnlyModelViewSet):
 
     filter_backends = (DjangoFilterBackend,)
     filter_fields = '__all__'
+    pagination_class = KeysetPaginate
 
     @action(detail=True, methods=['PUT'], url_path='remove-detail')
     def remove_details(self, request, pk):
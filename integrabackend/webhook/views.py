@@ -39,8 +39,8 @@ class FaveoWebHookView(viewsets.ViewSet):
             body = {'message': 'Service Request has aviso create'}
             return body, status.HTTP_400_BAD_REQUEST 
 
-        service_request.state, _ = self.state_model.objects.get_or_create(
-            name=self.status.closed)
+        service_request.state = self.state_model.objects.get_by_name(
+            self.status.closed)
         service_request.save()
         body = {'success': 'ok', 'message': 'close service request'}
         return body, status.HTTP_200_OK
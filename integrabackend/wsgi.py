@@ -11,3 +11,15 @@ os.environ.setdefault("DJANGO_CONFIGURATION", "Production")
 
 from configurations.wsgi import get_wsgi_application  # noqa
 application = get_wsgi_application()
+
+from django.db import DatabaseError  # noqa
+from integrabackend.contrib.http import install_pooled_requests  # noqa
+from integrabackend.contrib.models import warm_status_registry  # noqa
+from integrabackend.invitation.models import Terminal  # noqa
+install_pooled_requests()
+try:
+    warm_status_registry()
+    Terminal.objects.warm()
+except DatabaseError:
+    # The registry is warmed lazily on the first lookup of each model.
+    pass